@@ -0,0 +1,295 @@
+# -*- coding: utf8 -*-
+'''
+Benchmark every route of pyramid_skosprovider against synthetic vocabularies.
+
+Results are written as JSON, so runs against different commits can be
+compared:
+
+.. code-block:: bash
+
+    $ python benchmarks/run.py --sizes 1000,10000 --output before.json
+    $ git checkout my-branch
+    $ python benchmarks/run.py --sizes 1000,10000 --output after.json
+    $ python benchmarks/run.py --compare before.json after.json
+
+Settings can be passed to benchmark optional features:
+
+.. code-block:: bash
+
+    $ python benchmarks/run.py --setting skosprovider.cache.enabled=true
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from pyramid.config import Configurator
+from pyramid.interfaces import IRoutesMapper
+from webtest import TestApp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from vocabularies import build_vocabulary  # noqa: E402
+
+JSON = {'Accept': 'application/json'}
+JSONLD = {'Accept': 'application/ld+json'}
+
+
+def build_app(provider, settings):
+    config = Configurator(settings=settings)
+    config.include('pyramid_skosprovider')
+    config.get_skos_registry().register_provider(provider)
+    return config.make_wsgi_app()
+
+
+def scenarios(provider, rng):
+    '''
+    Build a function per route that returns the arguments of a request.
+
+    :rtype: :class:`dict` mapping route names to functions that return a
+        tuple of a path, query parameters and headers. Requests that are not
+        a GET add the method, their parameters are then sent as a JSON body.
+    '''
+    size = len(provider.list)
+    scheme = provider.get_vocabulary_id()
+    base = provider.concept_scheme.uri
+    concepts = [c.id for c in provider.list if c.type == 'concept']
+    parents = [c.id for c in provider.list if c.type == 'concept' and c.narrower]
+    # Concepts deep enough in the hierarchy to have a small subtree
+    deep = [id for id in parents if id > size // 100] or parents
+
+    def label():
+        # Substring searches and wildcard searches as sent by Dijit widgets
+        return rng.choice([
+            {'label': 'oak'},
+            {'label': 'larch'},
+            {'label': 'en beech*', 'mode': 'dijitFilteringSelect'},
+            {'label': '*willow*', 'mode': 'dijitFilteringSelect'}
+        ])
+
+    def bulk():
+        return rng.sample(concepts, min(50, len(concepts)))
+
+    def page():
+        start = rng.randrange(0, 4) * 25
+        return {'Accept': 'application/json', 'Range': 'items=%d-%d' % (start, start + 24)}
+
+    return {
+        'skosprovider.context': lambda: ('/jsonld/context/skos', {}, JSON),
+        'skosprovider.uri': lambda: (
+            '/uris', {'uri': '%s/%d' % (base, rng.randint(1, size))}, JSON
+        ),
+        'skosprovider.uri.deprecated': lambda: (
+            '/uris/%s/%d' % (base, rng.randint(1, size)), {}, JSON
+        ),
+        'skosprovider.cs': lambda: (
+            '/c', dict(label(), language=rng.choice(['en', 'nl'])), page()
+        ),
+        'skosprovider.conceptschemes': lambda: ('/conceptschemes', {}, JSON),
+        'skosprovider.conceptscheme': lambda: (
+            '/conceptschemes/%s' % scheme, {}, JSON
+        ),
+        'skosprovider.conceptscheme.jsonld': lambda: (
+            '/conceptschemes/%s.jsonld' % scheme, {}, JSONLD
+        ),
+        'skosprovider.conceptscheme.cs': lambda: (
+            '/conceptschemes/%s/c' % scheme,
+            dict(label(), sort=rng.choice(['label', '-label', 'sortlabel'])),
+            page()
+        ),
+        'skosprovider.conceptscheme.tc': lambda: (
+            '/conceptschemes/%s/topconcepts' % scheme, {}, JSON
+        ),
+        'skosprovider.conceptscheme.display_top': lambda: (
+            '/conceptschemes/%s/displaytop' % scheme, {}, JSON
+        ),
+        'skosprovider.c.jsonld': lambda: (
+            '/conceptschemes/%s/c/%d.jsonld' % (scheme, rng.choice(concepts)), {}, JSONLD
+        ),
+        'skosprovider.c': lambda: (
+            '/conceptschemes/%s/c/%d' % (scheme, rng.choice(concepts)),
+            {'language': rng.choice(['en', 'nl', 'fr'])},
+            JSON
+        ),
+        'skosprovider.c.display_children': lambda: (
+            '/conceptschemes/%s/c/%d/displaychildren' % (scheme, rng.choice(parents)), {}, JSON
+        ),
+        'skosprovider.c.expand': lambda: (
+            '/conceptschemes/%s/c/%d/expand' % (scheme, rng.choice(deep)), {}, JSON
+        ),
+        'skosprovider.conceptscheme.bulk': lambda: (
+            '/conceptschemes/%s/bulk' % scheme,
+            {'ids': ','.join(str(id) for id in bulk())},
+            JSON
+        ),
+        'skosprovider.bulk': lambda: (
+            '/bulk', [{'scheme_id': scheme, 'c_id': id} for id in bulk()], JSON, 'POST'
+        ),
+        'skosprovider.metrics': lambda: ('/metrics', {}, {}),
+    }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+def send(testapp, path, params, headers, method='GET'):
+    if method == 'GET':
+        return testapp.get(path, params, headers, status='*')
+    return testapp.request(
+        path, method=method, headers=headers, status='*',
+        body=json.dumps(params).encode('utf-8'), content_type='application/json'
+    )
+
+
+def bench_route(testapp, scenario, requests):
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(requests):
+        args = scenario()
+        t = time.perf_counter()
+        res = send(testapp, *args)
+        latencies.append((time.perf_counter() - t) * 1000)
+        if res.status_int >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    # Measure memory separately, tracing slows down every request
+    args = scenario()
+    tracemalloc.start()
+    send(testapp, *args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput': requests / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'peak_memory_bytes': peak
+    }
+
+
+def run(sizes, requests, settings, routes=None, seed=1):
+    results = {}
+    for size in sizes:
+        t = time.perf_counter()
+        provider = build_vocabulary(size)
+        build_seconds = time.perf_counter() - t
+        app = build_app(provider, settings)
+        testapp = TestApp(app)
+        rng = random.Random(seed)
+        available = scenarios(provider, rng)
+        mapper = app.registry.getUtility(IRoutesMapper)
+        registered = [r.name for r in mapper.get_routes()]
+        missing = [name for name in registered if name not in available]
+        if missing:
+            raise RuntimeError('No benchmark scenario for routes: %s' % ', '.join(missing))
+        results[str(size)] = {
+            'build_seconds': build_seconds,
+            'routes': {
+                name: bench_route(testapp, available[name], requests)
+                for name in registered if routes is None or name in routes
+            }
+        }
+        print('Benchmarked %d concepts.' % size, file=sys.stderr)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before, after):
+    '''
+    Print the relative change of every metric between two runs.
+    '''
+    print('%-8s %-40s %10s %10s %10s %10s' % (
+        'size', 'route', 'req/s', 'p50', 'p99', 'memory'
+    ))
+    for size, run in sorted(after['results'].items(), key=lambda i: int(i[0])):
+        if size not in before['results']:
+            continue
+        for route, metrics in sorted(run['routes'].items()):
+            old = before['results'][size]['routes'].get(route)
+            if old is None:
+                continue
+            changes = [
+                metrics[m] / old[m] if old[m] else float('nan')
+                for m in ('throughput', 'p50_ms', 'p99_ms', 'peak_memory_bytes')
+            ]
+            print('%-8s %-40s %9.2fx %9.2fx %9.2fx %9.2fx' % ((size, route) + tuple(changes)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--sizes', default='1000,10000',
+        help='Comma separated vocabulary sizes, eg. 1000,10000,100000,1000000.'
+    )
+    parser.add_argument(
+        '--requests', type=int, default=50,
+        help='Number of requests per route.'
+    )
+    parser.add_argument(
+        '--routes', default=None,
+        help='Comma separated route names to benchmark. Defaults to all routes.'
+    )
+    parser.add_argument(
+        '--setting', action='append', default=[],
+        help='A Pyramid setting as key=value. Can be repeated.'
+    )
+    parser.add_argument('--output', default=None, help='Write results to this file.')
+    parser.add_argument(
+        '--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+        help='Compare two result files instead of running the benchmarks.'
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            compare(json.load(before), json.load(after))
+        return
+
+    settings = dict(s.split('=', 1) for s in args.setting)
+    routes = args.routes.split(',') if args.routes else None
+    sizes = [int(s) for s in args.sizes.split(',')]
+    # Keep stdout clean for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(sizes, args.requests, settings, routes)
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'settings': settings,
+        'results': results
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
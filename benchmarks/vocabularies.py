@@ -0,0 +1,98 @@
+# -*- coding: utf8 -*-
+'''
+This module builds synthetic vocabularies for the benchmarks.
+'''
+
+import random
+
+from skosprovider.providers import DictionaryProvider
+from skosprovider.skos import (
+    ConceptScheme,
+    Label
+)
+
+WORDS = [
+    'oak', 'larch', 'chestnut', 'beech', 'birch', 'willow', 'poplar', 'maple',
+    'alder', 'ash', 'elm', 'hazel', 'lime', 'pine', 'spruce', 'yew', 'cedar',
+    'fir', 'holly', 'rowan', 'juniper', 'cypress', 'sequoia', 'magnolia'
+]
+
+LANGUAGES = ['en', 'nl', 'fr']
+
+
+def _labels(i, rng):
+    words = [rng.choice(WORDS) for j in range(2)]
+    labels = []
+    for language in LANGUAGES:
+        label = '%s %s %s %d' % (language, words[0], words[1], i)
+        labels.append({'type': 'prefLabel', 'language': language, 'label': label})
+    labels.append({'type': 'altLabel', 'language': 'en', 'label': '%s %d' % (words[1], i)})
+    labels.append({'type': 'sortLabel', 'language': 'nl', 'label': '%08d' % (i * 7919 % 100003)})
+    return labels
+
+
+def build_vocabulary(size, id='BENCH', branching=10, seed=1):
+    '''
+    Build a :class:`skosprovider.providers.DictionaryProvider` with a number
+    of concepts and collections.
+
+    The concepts form a tree where every concept has up to `branching`
+    narrower concepts, so the depth of the hierarchy grows with the size of
+    the vocabulary. Every concept has labels in several languages and some
+    have matches with external concepts. Every 100th item is a collection
+    with a broader concept. It becomes a thesaurus array that groups the
+    concepts that would otherwise have been its narrower concepts.
+
+    :param int size: Number of concepts and collections.
+    :param str id: Id of the provider.
+    :param int branching: Maximum number of narrower concepts per concept.
+    :param int seed: Seed for the random labels.
+    :rtype: :class:`skosprovider.providers.DictionaryProvider`
+    '''
+    rng = random.Random(seed)
+    base = 'http://id.example.org/%s' % id.lower()
+    items = []
+    for i in range(1, size + 1):
+        item = {
+            'id': i,
+            'uri': '%s/%d' % (base, i),
+            'labels': _labels(i, rng),
+            'notes': [
+                {'type': 'definition', 'language': 'en', 'note': 'Concept number %d.' % i}
+            ],
+            'narrower': [],
+            'broader': [],
+            'matches': {}
+        }
+        if i % 3 == 0:
+            item['matches']['close'] = ['http://id.example.org/external/%d' % (i // 3)]
+        if i % 5 == 0:
+            item['matches']['exact'] = ['http://id.example.org/other/%d' % (i // 5)]
+        items.append(item)
+    for i in range(2, size + 1):
+        parent = (i - 2) // branching + 1
+        items[i - 1]['broader'].append(parent)
+        items[parent - 1]['narrower'].append(i)
+    for item in items:
+        if item['id'] % 100 == 0 and item['narrower'] and item['broader']:
+            parent = items[item['broader'][0] - 1]
+            parent['narrower'].remove(item['id'])
+            parent.setdefault('subordinate_arrays', []).append(item['id'])
+            item['type'] = 'collection'
+            item['members'] = item.pop('narrower')
+            item['superordinates'] = item.pop('broader')
+            item.pop('matches')
+            for m in item['members']:
+                items[m - 1]['broader'] = []
+                items[m - 1]['member_of'] = [item['id']]
+    return DictionaryProvider(
+        {'id': id, 'default_language': 'en', 'subject': ['benchmark']},
+        items,
+        concept_scheme=ConceptScheme(
+            uri=base,
+            labels=[
+                Label('Benchmark vocabulary', 'prefLabel', 'en'),
+                Label('Benchmark thesaurus', 'prefLabel', 'nl')
+            ]
+        )
+    )
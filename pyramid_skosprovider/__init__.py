@@ -1,35 +1,151 @@
 # -*- coding: utf8 -*-
 
+import threading
+from collections import deque
+
 from zope.interface import Interface
 
 from skosprovider.registry import Registry
 
 from pyramid_skosprovider.renderers import (
+    IJSONStream,
+    JSONStream,
+    get_serializer,
     json_renderer,
-    jsonld_renderer
+    jsonld_renderer,
+    with_serializer
+)
+
+from pyramid_skosprovider.cache import (
+    ConceptSchemesCache,
+    ISingleFlight,
+    ISkosCache,
+    LRUCache,
+    SingleFlight
+)
+
+from pyramid_skosprovider.fanout import (
+    IFanOut,
+    FanOut
+)
+
+from pyramid_skosprovider.indexes import (
+    ISkosIndexes,
+    SkosIndexes
+)
+
+from pyramid_skosprovider.metrics import (
+    ISkosMetrics,
+    Metrics,
+    metrics_view
+)
+
+from pyramid_skosprovider.views import (
+    BULK_MAX_ITEMS,
+    IBulkMaxItems
+)
+
+from pyramid_skosprovider.timing import (
+    get_timings,
+    timed_renderer
 )
 
+from pyramid.events import ApplicationCreated
+
 from pyramid.path import (
     DottedNameResolver
 )
 
+from pyramid.settings import asbool
+
 
 class ISkosRegistry(Interface):
     pass
 
 
+class ISkosRegistryFactory(Interface):
+    pass
+
+
+class ISkosRegistryPool(Interface):
+    pass
+
+
 def _parse_settings(settings):
     defaults = {
         'skosregistry_location': 'registry',
+        'skosregistry_pool': False,
+        'skosregistry_pool_size': 10,
+        'cache.enabled': False,
+        'cache.max_entries': 1000,
+        'cache.ttl': 300,
+        'cache.max_stale': 0,
+        'query_cache.enabled': False,
+        'query_cache.max_entries': 100,
+        'query_cache.ttl': 30,
+        'conceptschemes_cache.enabled': False,
+        'conceptschemes_cache.max_entries': 20,
+        'conceptschemes_cache.ttl': 300,
+        'single_flight.enabled': False,
+        'fanout.enabled': False,
+        'fanout.workers': 4,
+        'fanout.timeout': 5.0,
+        'index.enabled': False,
+        'index.max_entries': 10000,
+        'index.ttl': 300,
+        'streaming.enabled': False,
+        'streaming.chunk_size': 500,
+        'timing.enabled': False,
+        'metrics.enabled': False,
+        'metrics.path': '/metrics',
+        'metrics.flush_interval': 1.0,
+        'json.backend': 'json',
+        'bulk.max_items': BULK_MAX_ITEMS,
     }
     args = defaults.copy()
 
     # string setting
-    for short_key_name in ('skosregistry_location', 'skosregistry_factory'):
+    for short_key_name in (
+        'skosregistry_location', 'skosregistry_factory', 'skosregistry_reset',
+        'metrics.path', 'metrics.multiprocess_dir', 'json.backend'
+    ):
         key_name = "skosprovider.%s" % short_key_name
         if key_name in settings:
             args[short_key_name] = settings.get(key_name)
 
+    # boolean settings
+    for short_key_name in (
+        'skosregistry_pool',
+        'cache.enabled', 'query_cache.enabled', 'conceptschemes_cache.enabled',
+        'single_flight.enabled', 'fanout.enabled',
+        'index.enabled', 'streaming.enabled', 'timing.enabled',
+        'metrics.enabled'
+    ):
+        key_name = "skosprovider.%s" % short_key_name
+        if key_name in settings:
+            args[short_key_name] = asbool(settings.get(key_name))
+
+    # integer settings
+    for short_key_name in (
+        'skosregistry_pool_size',
+        'cache.max_entries', 'cache.ttl', 'cache.max_stale',
+        'query_cache.max_entries', 'query_cache.ttl',
+        'conceptschemes_cache.max_entries', 'conceptschemes_cache.ttl',
+        'fanout.workers',
+        'index.max_entries', 'index.ttl',
+        'streaming.chunk_size',
+        'bulk.max_items'
+    ):
+        key_name = "skosprovider.%s" % short_key_name
+        if key_name in settings:
+            args[short_key_name] = int(settings.get(key_name))
+
+    # float settings
+    for short_key_name in ('fanout.timeout', 'metrics.flush_interval'):
+        key_name = "skosprovider.%s" % short_key_name
+        if key_name in settings:
+            args[short_key_name] = float(settings.get(key_name))
+
     return args
 
 
@@ -54,23 +170,115 @@ def _register_global_skos_registry(registry):
     return registry.queryUtility(ISkosRegistry)
 
 
-def _register_request_skos_registry(request):
+def _build_request_skos_registry(request):
     '''
-    Get the :class:`skosprovider.registry.Registry` attached to this request.
+    Default factory for a :class:`skosprovider.registry.Registry` attached to
+    a request.
 
     :param request: The Pyramid request
 
     :rtype: :class:`skosprovider.registry.Registry`
     '''
-    settings = _parse_settings(request.registry.settings)
+    return Registry(instance_scope='threaded_thread')
+
 
+def _resolve_request_skos_registry_factory(settings):
+    '''
+    Find the factory that builds a registry for every request.
+
+    :param dict settings: Settings as returned by :func:`_parse_settings`.
+    :rtype: callable
+    '''
     if 'skosregistry_factory' in settings:
         r = DottedNameResolver()
-        skos_registry = r.resolve(settings['skosregistry_factory'])(request)
-    else:
-        skos_registry = Registry(instance_scope='threaded_thread')
+        return r.resolve(settings['skosregistry_factory'])
+    return _build_request_skos_registry
+
+
+class RegistryPool(object):
+    '''
+    Keeps registries that were built for earlier requests, so they can be
+    reused by later requests.
+
+    :param callable factory: Builds a new registry for a request.
+    :param int size: Maximum number of idle registries to keep.
+    :param callable reset: Optional. Called with a pooled registry and the
+        new request every time a registry is reused, so any state that
+        belonged to an earlier request can be cleared.
+    '''
 
-    return skos_registry
+    def __init__(self, factory, size=10, reset=None):
+        self.factory = factory
+        self.size = size
+        self.reset = reset
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, request):
+        '''
+        Get a registry for a request. It's returned to the pool when the
+        request has finished.
+
+        :param request: The Pyramid request
+
+        :rtype: :class:`skosprovider.registry.Registry`
+        '''
+        with self._lock:
+            skos_registry = self._idle.pop() if self._idle else None
+        if skos_registry is None:
+            skos_registry = self.factory(request)
+        elif self.reset is not None:
+            self.reset(skos_registry, request)
+
+        def release(request):
+            # Registries used by a failed request might be in a bad state
+            if getattr(request, 'exception', None) is None:
+                self.release(skos_registry)
+
+        request.add_finished_callback(release)
+        return skos_registry
+
+    def release(self, skos_registry):
+        '''
+        Return a registry to the pool.
+        '''
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(skos_registry)
+
+
+def _register_request_skos_registry(request):
+    '''
+    Get the :class:`skosprovider.registry.Registry` attached to this request.
+
+    :param request: The Pyramid request
+
+    :rtype: :class:`skosprovider.registry.Registry`
+    '''
+    pool = request.registry.queryUtility(ISkosRegistryPool)
+    if pool is not None:
+        return pool.acquire(request)
+
+    factory = request.registry.queryUtility(ISkosRegistryFactory)
+    if factory is None:
+        factory = _resolve_request_skos_registry_factory(
+            _parse_settings(request.registry.settings)
+        )
+    return factory(request)
+
+
+def _build_indexes(event):
+    '''
+    Index the providers of a registry attached to the Pyramid registry once
+    the application has been created.
+
+    :param pyramid.events.ApplicationCreated event:
+    '''
+    registry = event.app.registry
+    indexes = registry.queryUtility(ISkosIndexes)
+    skos_registry = registry.queryUtility(ISkosRegistry)
+    if indexes is not None and skos_registry is not None:
+        indexes.build(skos_registry)
 
 
 def get_skos_registry(registry):
@@ -109,14 +317,102 @@ def includeme(config):
             reify=True
         )
     else:
+        factory = _resolve_request_skos_registry_factory(settings)
+        config.registry.registerUtility(factory, ISkosRegistryFactory)
+        if settings['skosregistry_pool']:
+            reset = None
+            if 'skosregistry_reset' in settings:
+                reset = DottedNameResolver().resolve(settings['skosregistry_reset'])
+            config.registry.registerUtility(
+                RegistryPool(factory, settings['skosregistry_pool_size'], reset),
+                ISkosRegistryPool
+            )
         config.add_request_method(
             _register_request_skos_registry,
             'skos_registry',
             reify=True
         )
 
-    config.add_renderer('skosjson', json_renderer)
-    config.add_renderer('skosjsonld', jsonld_renderer)
+    if settings['cache.enabled']:
+        config.registry.registerUtility(
+            LRUCache(
+                settings['cache.max_entries'],
+                settings['cache.ttl'],
+                settings['cache.max_stale']
+            ),
+            ISkosCache,
+            name='render'
+        )
+
+    if settings['query_cache.enabled']:
+        config.registry.registerUtility(
+            LRUCache(settings['query_cache.max_entries'], settings['query_cache.ttl']),
+            ISkosCache,
+            name='query'
+        )
+
+    if settings['conceptschemes_cache.enabled']:
+        config.registry.registerUtility(
+            ConceptSchemesCache(
+                settings['conceptschemes_cache.max_entries'],
+                settings['conceptschemes_cache.ttl']
+            ),
+            ISkosCache,
+            name='conceptschemes'
+        )
+
+    if settings['single_flight.enabled']:
+        config.registry.registerUtility(SingleFlight(), ISingleFlight)
+
+    if settings['index.enabled']:
+        config.registry.registerUtility(
+            SkosIndexes(settings['index.max_entries'], settings['index.ttl']),
+            ISkosIndexes
+        )
+        if settings['skosregistry_location'] == 'registry':
+            config.add_subscriber(_build_indexes, ApplicationCreated)
+
+    if settings['fanout.enabled']:
+        config.registry.registerUtility(
+            FanOut(settings['fanout.workers'], settings['fanout.timeout']),
+            IFanOut
+        )
+
+    serializer = get_serializer(settings['json.backend'])
+    skosjson = with_serializer(json_renderer, serializer)
+    skosjsonld = with_serializer(jsonld_renderer, serializer)
+
+    if settings['streaming.enabled']:
+        config.registry.registerUtility(
+            JSONStream(skosjson, settings['streaming.chunk_size']),
+            IJSONStream
+        )
+
+    if settings['metrics.enabled']:
+        config.registry.registerUtility(
+            Metrics(
+                multiprocess_dir=settings.get('metrics.multiprocess_dir'),
+                flush_interval=settings['metrics.flush_interval']
+            ),
+            ISkosMetrics
+        )
+        config.add_tween('pyramid_skosprovider.metrics.metrics_tween_factory')
+        config.add_route('skosprovider.metrics', settings['metrics.path'])
+        config.add_view(
+            metrics_view,
+            route_name='skosprovider.metrics',
+            request_method='GET'
+        )
+
+    if settings['timing.enabled']:
+        config.add_request_method(get_timings, 'skos_timings', reify=True)
+        config.add_renderer('skosjson', timed_renderer(skosjson))
+        config.add_renderer('skosjsonld', timed_renderer(skosjsonld))
+    else:
+        config.add_renderer('skosjson', skosjson)
+        config.add_renderer('skosjsonld', skosjsonld)
+
+    config.registry.registerUtility(settings['bulk.max_items'], IBulkMaxItems)
 
     config.add_directive('get_skos_registry', get_skos_registry)
 
@@ -136,6 +432,10 @@ def includeme(config):
         'skosprovider.cs',
         '/c'
     )
+    config.add_route(
+        'skosprovider.bulk',
+        '/bulk'
+    )
     config.add_route(
         'skosprovider.conceptschemes',
         '/conceptschemes'
@@ -152,6 +452,10 @@ def includeme(config):
         'skosprovider.conceptscheme.cs',
         '/conceptschemes/{scheme_id}/c'
     )
+    config.add_route(
+        'skosprovider.conceptscheme.bulk',
+        '/conceptschemes/{scheme_id}/bulk'
+    )
     config.add_route(
         'skosprovider.conceptscheme.tc',
         '/conceptschemes/{scheme_id}/topconcepts'
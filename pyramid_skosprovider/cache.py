@@ -0,0 +1,275 @@
+# -*- coding: utf8 -*-
+'''
+This module contains the in-process caches used by pyramid_skosprovider.
+'''
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from zope.interface import Interface
+
+
+class ISkosCache(Interface):
+    pass
+
+
+class ISingleFlight(Interface):
+    pass
+
+
+class LRUCache(object):
+    '''
+    A thread safe, in-process cache with a maximum number of entries and a
+    time to live.
+
+    When the cache is full, the least recently used entry is evicted. Entries
+    older than the time to live are treated as missing, but they can still be
+    used as a stale entry for `max_stale` seconds.
+
+    :param int max_entries: The maximum number of entries to keep.
+    :param int ttl: Number of seconds an entry remains valid.
+    :param int max_stale: Number of seconds an entry can be used after it
+        stopped being valid.
+    '''
+
+    def __init__(self, max_entries=1000, ttl=300, max_stale=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        '''
+        Get a value from the cache.
+
+        :param key: A hashable key.
+        :param default: Value to return if the key is missing or expired.
+        '''
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_stale(self, key):
+        '''
+        Get a value from the cache, even if it's no longer valid.
+
+        :param key: A hashable key.
+        :returns: A :class:`tuple` of the value and its age in seconds, or
+            `None` if the key is missing or has been stale for more than
+            `max_stale` seconds.
+        '''
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            age = time.monotonic() - entry[0]
+            if age > self.ttl + self.max_stale:
+                return None
+            return entry[1], age
+
+    def start_refresh(self, key):
+        '''
+        Claim the refresh of a stale entry.
+
+        :param key: A hashable key.
+        :returns: `True` if the caller should refresh the entry, `False` if
+            it's already being refreshed.
+        '''
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        '''
+        Release the refresh of an entry claimed with :meth:`start_refresh`.
+        '''
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def set(self, key, value):
+        '''
+        Store a value in the cache.
+
+        :param key: A hashable key.
+        :param value: The value to store.
+        '''
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        '''
+        Remove a single key from the cache.
+        '''
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        '''
+        Remove everything from the cache.
+        '''
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        '''
+        Get the hit and miss counters for this cache.
+
+        :rtype: :class:`dict` with keys `hits`, `misses` and `entries`.
+        '''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._data)
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ConceptSchemesCache(LRUCache):
+    '''
+    Caches the listing of conceptschemes per language and remembers the last
+    label that could be fetched for every conceptscheme.
+
+    A listing is only used as long as the same providers are registered.
+
+    :param int max_entries: The maximum number of listings to keep.
+    :param int ttl: Number of seconds a listing remains valid.
+    '''
+
+    def __init__(self, max_entries=20, ttl=300):
+        super().__init__(max_entries, ttl)
+        self._labels = {}
+
+    @staticmethod
+    def fingerprint(providers, shared=True):
+        '''
+        Describe the providers a listing was built for.
+
+        :param list providers: The providers in the listing.
+        :param boolean shared: Are the providers shared by all requests? If
+            they are, a provider or conceptscheme that was replaced is
+            detected as well.
+        :rtype: :class:`tuple`
+        '''
+        return tuple(
+            (
+                p.get_vocabulary_id(),
+                p.metadata.get('uri'),
+                tuple(p.metadata.get('subject') or ()),
+                # Don't trigger providers that fetch their conceptscheme
+                (id(p), id(p.__dict__.get('concept_scheme'))) if shared else None
+            )
+            for p in providers
+        )
+
+    def remember_label(self, provider_id, language, label):
+        '''
+        Remember the label of a conceptscheme in a language.
+        '''
+        with self._lock:
+            self._labels[(provider_id, language)] = label
+
+    def last_label(self, provider_id, language, default=None):
+        '''
+        Get the last label that was remembered for a conceptscheme.
+        '''
+        with self._lock:
+            return self._labels.get((provider_id, language), default)
+
+    def forget_provider(self, provider_id):
+        '''
+        Forget all listings and the labels of a provider, eg. because its
+        conceptscheme was reloaded.
+
+        :param provider_id: Id of the provider.
+        '''
+        with self._lock:
+            self._data.clear()
+            for key in [k for k in self._labels if k[0] == provider_id]:
+                del self._labels[key]
+
+
+class SingleFlight(object):
+    '''
+    Lets concurrent calls with the same key share a single call.
+
+    The first caller makes the call. Callers that arrive while it's running
+    wait for it and get the same result or exception.
+    '''
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        '''
+        Call a function, unless a call with the same key is running.
+
+        :param key: A hashable key that identifies the call.
+        :param callable func: Is called without arguments.
+        :returns: The result of the call.
+        '''
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
+
+
+def get_single_flight(registry):
+    '''
+    Get the :class:`SingleFlight` configured for this application.
+
+    :param registry: The Pyramid registry.
+    :returns: A :class:`SingleFlight` or `None` if identical lookups are not
+        coalesced.
+    '''
+    return registry.queryUtility(ISingleFlight)
+
+
+def get_cache(registry, name):
+    '''
+    Get a cache that was configured for this application.
+
+    :param registry: The Pyramid registry.
+    :param str name: Name of the cache, eg. `render`.
+    :returns: A :class:`LRUCache` or `None` if this cache is not enabled. The
+        `conceptschemes` cache is a :class:`ConceptSchemesCache`.
+    '''
+    return registry.queryUtility(ISkosCache, name=name)
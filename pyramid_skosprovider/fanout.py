@@ -0,0 +1,115 @@
+# -*- coding: utf8 -*-
+'''
+This module contains a thread pool for querying several providers at the
+same time.
+'''
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from zope.interface import Interface
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class IFanOut(Interface):
+    pass
+
+
+class FanOut(object):
+    '''
+    Calls a function for a number of providers in parallel.
+
+    Providers that don't answer within the timeout or that raise an exception
+    are left out of the results. Their threads can not be stopped, but their
+    results will be ignored. A provider is not called again until its last
+    call that was too late has finished, so a slow provider holds at most one
+    thread and can't keep the other providers waiting.
+
+    Only use this with providers that can safely be used from multiple
+    threads at the same time.
+
+    :param int workers: Number of threads used to query providers.
+    :param float timeout: Number of seconds a provider gets to answer,
+        counting from the moment the providers are dispatched.
+    '''
+
+    def __init__(self, workers=4, timeout=5):
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='skosprovider-fanout'
+        )
+        # Calls that were too late, but are still running, per provider
+        self._abandoned = {}
+        self._lock = threading.Lock()
+
+    def map(self, func, providers):
+        '''
+        Call a function for every provider.
+
+        :param callable func: Receives a provider as its only argument.
+        :param list providers: The providers.
+        :returns: A tuple of a list and a list. The first list contains
+            tuples of a provider and the result of calling the function, for
+            every provider that answered, in the original order. The second
+            list contains the ids of the providers that failed or were
+            too late.
+        '''
+        futures = []
+        with self._lock:
+            for p in providers:
+                if p.get_vocabulary_id() in self._abandoned:
+                    futures.append((p, None))
+                else:
+                    futures.append((p, self.executor.submit(func, p)))
+        deadline = time.monotonic() + self.timeout
+        results = []
+        failed = []
+        for p, future in futures:
+            if future is None:
+                log.warning(
+                    'Provider %s was skipped: a previous call is still running',
+                    p.get_vocabulary_id()
+                )
+                failed.append(p.get_vocabulary_id())
+                continue
+            try:
+                results.append(
+                    (p, future.result(timeout=max(deadline - time.monotonic(), 0)))
+                )
+            except Exception as e:
+                if not future.cancel() and not future.done():
+                    self._abandon(p.get_vocabulary_id(), future)
+                log.warning(
+                    'Provider %s was skipped: %r', p.get_vocabulary_id(), e
+                )
+                failed.append(p.get_vocabulary_id())
+        return results, failed
+
+    def _abandon(self, provider_id, future):
+        def forget(future):
+            with self._lock:
+                if self._abandoned.get(provider_id) is future:
+                    del self._abandoned[provider_id]
+
+        with self._lock:
+            self._abandoned[provider_id] = future
+        # Runs right away if the call finished in the meantime
+        future.add_done_callback(forget)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+def get_fanout(registry):
+    '''
+    Get the :class:`FanOut` configured for this application.
+
+    :param registry: The Pyramid registry.
+    :returns: A :class:`FanOut` or `None` if parallel queries are not
+        enabled.
+    '''
+    return registry.queryUtility(IFanOut)
@@ -0,0 +1,512 @@
+# -*- coding: utf8 -*-
+'''
+This module contains indexes that speed up lookups in providers that keep
+all their concepts and collections in memory.
+'''
+
+import bisect
+import heapq
+import threading
+from array import array
+
+from zope.interface import Interface
+
+from skosprovider.providers import MemoryProvider
+from skosprovider.skos import (
+    Collection,
+    Concept
+)
+
+from pyramid_skosprovider.cache import LRUCache
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class ISkosIndexes(Interface):
+    pass
+
+
+class LabelIndex(object):
+    '''
+    The labels of all concepts and collections of a provider, as they are
+    displayed in a certain language, sorted for fast prefix and suffix
+    lookups.
+
+    Labels are compared case-folded.
+
+    :param skosprovider.providers.MemoryProvider provider: The provider to
+        index.
+    :param str language: The language the labels are displayed in.
+    '''
+
+    def __init__(self, provider, language):
+        entries = []
+        for i, c in enumerate(provider.list):
+            label = c.label(language)
+            if label is not None:
+                entries.append((label.label.casefold(), i))
+        entries.sort()
+        self.keys = [key for key, i in entries]
+        self.positions = [i for key, i in entries]
+        entries = sorted((key[::-1], i) for key, i in entries)
+        self.reversed_keys = [key for key, i in entries]
+        self.reversed_positions = [i for key, i in entries]
+
+    def startswith(self, term):
+        '''
+        Find the concepts and collections whose label starts with a term.
+
+        :param str term: The start of the label.
+        :rtype: :class:`list` of positions in the provider's list.
+        '''
+        return self._lookup(self.keys, self.positions, term.casefold())
+
+    def endswith(self, term):
+        '''
+        Find the concepts and collections whose label ends with a term.
+
+        :param str term: The end of the label.
+        :rtype: :class:`list` of positions in the provider's list.
+        '''
+        return self._lookup(
+            self.reversed_keys, self.reversed_positions, term.casefold()[::-1]
+        )
+
+    @staticmethod
+    def _lookup(keys, positions, prefix):
+        start = bisect.bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return positions[start:end]
+
+
+class ProviderIndex(object):
+    '''
+    Indexes for a single :class:`skosprovider.providers.MemoryProvider`.
+
+    Label indexes and sort orders are built the first time a language is
+    needed. The members of a collection are gathered the first time someone
+    searches in that collection.
+
+    :param skosprovider.providers.MemoryProvider provider: The provider to
+        index.
+    :param int max_languages: Maximum number of languages to keep label
+        indexes and sort orders for.
+    '''
+
+    def __init__(self, provider, max_languages=10):
+        self.provider_id = provider.get_vocabulary_id()
+        self._list = provider.list
+        self._size = len(provider.list)
+        self._lock = threading.Lock()
+        self.uris = {
+            str(c.uri): (c.id, c.type) for c in provider.list if c.uri
+        }
+        self.ids = {}
+        self.matches = {}
+        for i, c in enumerate(provider.list):
+            self.ids.setdefault(str(c.id), []).append(i)
+            if c.type == 'concept':
+                for type, uris in c.matches.items():
+                    for uri in uris:
+                        self.matches.setdefault(uri, {}).setdefault(type, []).append(i)
+        self.labels = LRUCache(max_languages, float('inf'))
+        self.ranks = LRUCache(max_languages * 4, float('inf'))
+        self.members = {}
+
+    def is_current(self, provider):
+        '''
+        Is this index still valid for this provider?
+
+        An index becomes invalid when the provider's list of concepts and
+        collections is replaced or changes size.
+
+        :rtype: boolean
+        '''
+        return provider.list is self._list and len(provider.list) == self._size
+
+    def get_labels(self, provider, language):
+        '''
+        Get the :class:`LabelIndex` for a language.
+
+        :param skosprovider.providers.MemoryProvider provider: The provider
+            this index was built for.
+        :param str language: The language the labels are displayed in.
+        :rtype: :class:`LabelIndex`
+        '''
+        labels = self.labels.get(language)
+        if labels is None:
+            with self._lock:
+                labels = self.labels.get(language)
+                if labels is None:
+                    labels = LabelIndex(provider, language)
+                    self.labels.set(language, labels)
+        return labels
+
+    def get_ranks(self, provider, sort, language):
+        '''
+        Get the rank of every concept and collection when they are sorted.
+
+        The concepts and collections are sorted on the same keys the provider
+        uses, see :meth:`skosprovider.skos.Concept._sortkey`. Those with the
+        same key share a rank.
+
+        :param skosprovider.providers.MemoryProvider provider: The provider
+            this index was built for.
+        :param str sort: What to sort on: `id`, `uri`, `label` or
+            `sortlabel`.
+        :param str language: The language to sort the labels in.
+        :rtype: :class:`array.array` with the rank of every concept and
+            collection, in the order of the provider's list.
+        '''
+        # Any other value sorts on the label
+        sort = sort if sort in ('id', 'uri', 'sortlabel') else 'label'
+        ranks = self.ranks.get((sort, language))
+        if ranks is None:
+            with self._lock:
+                ranks = self.ranks.get((sort, language))
+                if ranks is None:
+                    keys = [c._sortkey(sort, language) for c in provider.list]
+                    ranks = array('I', bytes(4 * len(keys)))
+                    rank = 0
+                    previous = None
+                    for i in sorted(range(len(keys)), key=keys.__getitem__):
+                        if keys[i] != previous:
+                            rank += 1
+                            previous = keys[i]
+                        ranks[i] = rank
+                    self.ranks.set((sort, language), ranks)
+        return ranks
+
+    def get_members(self, provider, collection, depth=None):
+        '''
+        Get the ids of all members of a collection.
+
+        :param skosprovider.providers.MemoryProvider provider: The provider
+            this index was built for.
+        :param skosprovider.skos.Collection collection: The collection.
+        :param str depth: `all` to include the members of members, like
+            :meth:`skosprovider.providers.MemoryProvider.expand` does.
+            Otherwise only the direct members are returned.
+        :rtype: :class:`frozenset` of ids as strings.
+        '''
+        key = (str(collection.id), depth == 'all')
+        members = self.members.get(key)
+        if members is None:
+            ids = provider.expand(collection.id) if depth == 'all' else collection.members
+            members = frozenset(str(id) for id in ids)
+            with self._lock:
+                self.members[key] = members
+        return members
+
+    def get_matches(self, uri, type=None):
+        '''
+        Find the concepts that match an external concept.
+
+        :param str uri: URI of the external concept.
+        :param str type: Optional. Type of match, eg. `close`. A close match
+            includes exact matches. Without a type, all types of matches are
+            considered.
+        :rtype: :class:`set` of positions in the provider's list.
+        '''
+        matches = self.matches.get(uri, {})
+        if not type:
+            types = Concept.matchtypes
+        elif type == 'close':
+            types = ['close', 'exact']
+        else:
+            types = [type]
+        return set(i for t in types for i in matches.get(t, []))
+
+    def find(self, provider, query, startswith=None, endswith=None, **kwargs):
+        '''
+        Search the provider like
+        :meth:`skosprovider.providers.MemoryProvider.find` does, but only
+        look at the concepts and collections the indexes point to.
+
+        :param skosprovider.providers.MemoryProvider provider: The provider
+            this index was built for.
+        :param dict query: The query, as passed to the provider.
+        :param str startswith: Optional. Only the results whose label starts
+            with this term are needed. Others may still be returned.
+        :param str endswith: Optional. Only the results whose label ends
+            with this term are needed. Others may still be returned.
+        :rtype: :class:`list`, the same list the provider would return.
+        '''
+        positions = self._search(provider, query, startswith, endswith, **kwargs)
+        if positions is None:
+            return provider.find(query, **kwargs)
+        return [
+            provider._get_find_dict(provider.list[i], **kwargs)
+            for i in self._sort(provider, positions, **kwargs)
+        ]
+
+    def find_page(self, provider, query, offset, limit, **kwargs):
+        '''
+        Get a range of the results of :meth:`find`.
+
+        Only the results up to the end of the range are sorted.
+
+        :param skosprovider.providers.MemoryProvider provider: The provider
+            this index was built for.
+        :param dict query: The query, as passed to the provider.
+        :param int offset: Position of the first result to return.
+        :param int limit: Maximum number of results to return.
+        :rtype: :class:`tuple` of the results in the range and the total
+            number of results.
+        '''
+        positions = self._search(provider, query, **kwargs)
+        if positions is None:
+            concepts = provider.find(query, **kwargs)
+            return concepts[offset:offset + limit], len(concepts)
+        page = self._sort(provider, positions, offset + limit, **kwargs)[offset:offset + limit]
+        return (
+            [provider._get_find_dict(provider.list[i], **kwargs) for i in page],
+            len(positions)
+        )
+
+    def _search(self, provider, query, startswith=None, endswith=None, **kwargs):
+        '''
+        Get the positions of the concepts and collections that match a query.
+
+        :returns: A :class:`list` of positions in the order of the provider's
+            list, or `None` if the provider should handle this query itself.
+        '''
+        query = provider._normalise_query(dict(query))
+        language = provider._get_language(**kwargs)
+        candidates = None
+        if 'collection' in query:
+            collection = self._get_by_id(provider, query['collection']['id'])
+            if not isinstance(collection, Collection):
+                # Let the provider decide how to handle an unknown collection
+                return None
+            members = self.get_members(provider, collection, query['collection'].get('depth'))
+            candidates = set(
+                i for id in members for i in self.ids.get(id, [])
+            )
+            query.pop('collection')
+        if 'matches' in query:
+            if not query['matches'].get('uri'):
+                # Let the provider decide how to handle a missing URI
+                return None
+            # Collections are never checked for matches
+            if query.get('type') == 'concept':
+                candidates = self._intersect(candidates, self.get_matches(
+                    query['matches']['uri'], query['matches'].get('type')
+                ))
+        if startswith:
+            candidates = self._intersect(
+                candidates, self.get_labels(provider, language).startswith(startswith)
+            )
+        elif endswith:
+            candidates = self._intersect(
+                candidates, self.get_labels(provider, language).endswith(endswith)
+            )
+        positions = range(len(provider.list)) if candidates is None else sorted(candidates)
+        if not query:
+            return list(positions)
+        return [i for i in positions if provider._include_in_find(provider.list[i], query)]
+
+    def _sort(self, provider, positions, limit=None, **kwargs):
+        '''
+        Sort the positions of concepts and collections like the provider
+        would sort them.
+
+        :param int limit: Optional. Only the first `limit` positions are
+            needed. Others may still be returned.
+        '''
+        sort = provider._get_sort(**kwargs)
+        if not sort:
+            return positions
+        language = provider._get_language(**kwargs)
+        reverse = provider._get_sort_order(**kwargs) == 'desc'
+        if type(provider)._sort is not MemoryProvider._sort or not isinstance(language, str):
+            position = {id(c): i for i, c in enumerate(provider.list)}
+            return [
+                position[id(c)] for c in
+                provider._sort([provider.list[i] for i in positions], sort, language, reverse)
+            ]
+        ranks = self.get_ranks(provider, sort, language)
+        if limit is not None and limit * 8 < len(positions):
+            # Only select the first positions, in the same stable order
+            if reverse:
+                return heapq.nsmallest(limit, positions, key=lambda i: -ranks[i])
+            return heapq.nsmallest(limit, positions, key=ranks.__getitem__)
+        # Sorting is stable, like the provider's sort
+        return sorted(positions, key=ranks.__getitem__, reverse=reverse)
+
+    def _get_by_id(self, provider, id):
+        positions = self.ids.get(str(id))
+        return provider.list[positions[0]] if positions else False
+
+    @staticmethod
+    def _intersect(candidates, positions):
+        if candidates is None:
+            return set(positions)
+        return candidates.intersection(positions)
+
+
+class SkosIndexes(object):
+    '''
+    Keeps a :class:`ProviderIndex` for every provider that can be indexed and
+    remembers lookups in providers that can't be indexed.
+
+    :param int max_entries: Maximum number of lookups to remember.
+    :param int ttl: Number of seconds a lookup is remembered.
+    :param int max_languages: Maximum number of languages to keep label
+        indexes for, per provider.
+    '''
+
+    def __init__(self, max_entries=10000, ttl=300, max_languages=10):
+        self.lookups = LRUCache(max_entries, ttl)
+        self.max_languages = max_languages
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider):
+        '''
+        Get an up to date index for a provider.
+
+        :param provider: A :class:`skosprovider.providers.VocabularyProvider`.
+        :returns: A :class:`ProviderIndex` or `None` if this provider can't
+            be indexed.
+        '''
+        if not isinstance(provider, MemoryProvider):
+            return None
+        pid = provider.get_vocabulary_id()
+        index = self._indexes.get(pid)
+        if index is None or not index.is_current(provider):
+            with self._lock:
+                index = self._indexes.get(pid)
+                if index is None or not index.is_current(provider):
+                    log.debug('Building index for provider %s.', pid)
+                    index = ProviderIndex(provider, self.max_languages)
+                    self._indexes[pid] = index
+        return index
+
+    def build(self, skos_registry):
+        '''
+        Build the indexes for all providers in a registry.
+
+        :param skosprovider.registry.Registry skos_registry:
+        '''
+        for p in skos_registry.get_providers():
+            self.get(p)
+
+    def find(self, provider, query, startswith=None, endswith=None, **kwargs):
+        '''
+        Search a provider using its indexes.
+
+        Only providers that keep all their data in memory and use the default
+        search of :class:`skosprovider.providers.MemoryProvider` are searched
+        this way. They return exactly the same results as they would have
+        without indexes.
+
+        :param provider: A :class:`skosprovider.providers.VocabularyProvider`.
+        :param dict query: The query, as passed to the provider.
+        :param str startswith: Optional. Only the results whose label starts
+            with this term are needed.
+        :param str endswith: Optional. Only the results whose label ends
+            with this term are needed.
+        :returns: A :class:`list` of results or `None` if the provider can't
+            be searched with indexes.
+        '''
+        if type(provider).find is not MemoryProvider.find:
+            return None
+        index = self.get(provider)
+        if index is None:
+            return None
+        return index.find(provider, query, startswith, endswith, **kwargs)
+
+    def find_page(self, provider, query, offset, limit, **kwargs):
+        '''
+        Get a range of the results of a search, using the indexes.
+
+        Only the results up to the end of the range are sorted, so the first
+        pages of a large result set are cheap.
+
+        :param provider: A :class:`skosprovider.providers.VocabularyProvider`.
+        :param dict query: The query, as passed to the provider.
+        :param int offset: Position of the first result to return.
+        :param int limit: Maximum number of results to return.
+        :returns: A :class:`tuple` of the results in the range and the total
+            number of results, or `None` if the provider can't be searched
+            with indexes.
+        '''
+        if type(provider).find is not MemoryProvider.find:
+            return None
+        index = self.get(provider)
+        if index is None:
+            return None
+        return index.find_page(provider, query, offset, limit, **kwargs)
+
+    def invalidate(self, provider_id):
+        '''
+        Forget the index for a provider, eg. because its data was reloaded.
+
+        :param provider_id: Id of the provider.
+        '''
+        with self._lock:
+            self._indexes.pop(provider_id, None)
+        self.lookups.clear()
+
+    def _fingerprint(self, providers):
+        return tuple(
+            (p.get_vocabulary_id(), id(p.list), len(p.list))
+            if isinstance(p, MemoryProvider) else p.get_vocabulary_id()
+            for p in providers
+        )
+
+    def resolve_uri(self, skos_registry, uri):
+        '''
+        Find the concept or collection with a certain URI.
+
+        Providers whose conceptscheme URI is a prefix of the URI are searched
+        first, like :meth:`skosprovider.registry.Registry.get_by_uri` does.
+        Providers that have been indexed are searched with a single
+        dictionary lookup. Lookups in other providers and URIs that were not
+        found are remembered.
+
+        :param skosprovider.registry.Registry skos_registry:
+        :param str uri: The URI to look for.
+        :returns: A tuple of the provider, the id and the type of the concept
+            or collection, or `None` if the URI is unknown.
+        '''
+        providers = skos_registry.get_providers()
+        key = (uri, self._fingerprint(providers))
+        found = self.lookups.get(key)
+        if found is not None:
+            if not found:
+                return None
+            pid, id, type = found
+            return skos_registry.get_provider(pid), id, type
+        csuris = [
+            csuri for csuri in skos_registry.concept_scheme_uri_map.keys()
+            if uri.startswith(csuri)
+        ]
+        likely = [skos_registry.get_provider(csuri) for csuri in csuris]
+        for p in likely + [p for p in providers if p not in likely]:
+            index = self.get(p)
+            if index is not None:
+                if uri in index.uris:
+                    id, type = index.uris[uri]
+                    return p, id, type
+            else:
+                c = p.get_by_uri(uri)
+                if c:
+                    self.lookups.set(key, (p.get_vocabulary_id(), c.id, c.type))
+                    return p, c.id, c.type
+        self.lookups.set(key, False)
+        return None
+
+
+def get_indexes(registry):
+    '''
+    Get the :class:`SkosIndexes` configured for this application.
+
+    :param registry: The Pyramid registry.
+    :returns: A :class:`SkosIndexes` or `None` if indexing is not enabled.
+    '''
+    return registry.queryUtility(ISkosIndexes)
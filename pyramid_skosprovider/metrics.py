@@ -0,0 +1,403 @@
+# -*- coding: utf8 -*-
+'''
+This module collects request metrics and exposes them in the Prometheus text
+format.
+'''
+
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+from zope.interface import Interface
+
+from pyramid.response import Response
+
+from skosprovider.exceptions import ProviderUnavailableException
+
+from pyramid_skosprovider.cache import ISkosCache
+
+import logging
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HELP = {
+    'skosprovider_requests_total': ('counter', 'Number of requests handled.'),
+    'skosprovider_request_duration_seconds': (
+        'histogram', 'Time spent handling requests.'
+    ),
+    'skosprovider_errors_total': (
+        'counter', 'Number of requests that failed or found nothing.'
+    ),
+    'skosprovider_cache_hits_total': ('counter', 'Number of cache hits.'),
+    'skosprovider_cache_misses_total': ('counter', 'Number of cache misses.'),
+    'skosprovider_cache_entries': ('gauge', 'Number of entries in a cache.'),
+    'skosprovider_cache_hit_ratio': (
+        'gauge', 'Fraction of cache lookups that were hits.'
+    ),
+}
+
+
+class ISkosMetrics(Interface):
+    pass
+
+
+class Metrics(object):
+    '''
+    Thread safe counters and latency histograms for the requests handled by
+    pyramid_skosprovider.
+
+    When several worker processes serve the same application, every worker
+    can write its metrics to a shared directory. Scraping any worker then
+    returns the sum of all workers. Counters and histograms of workers that
+    have exited are still included, but their cache sizes and hit ratios are
+    not.
+
+    :param tuple buckets: Upper bounds of the latency histogram buckets, in
+        seconds.
+    :param str multiprocess_dir: Optional. A directory shared by all worker
+        processes.
+    :param float flush_interval: Number of seconds between writes to the
+        shared directory.
+    '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, multiprocess_dir=None, flush_interval=1.0):
+        self.buckets = tuple(sorted(buckets))
+        self.multiprocess_dir = multiprocess_dir
+        self.flush_interval = flush_interval
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed = time.monotonic()
+
+    def observe(self, route, provider, status, duration, error=None):
+        '''
+        Record a request.
+
+        :param str route: Name of the route that handled the request.
+        :param str provider: Id of the provider that was requested or an
+            empty string.
+        :param int status: HTTP status of the response.
+        :param float duration: Number of seconds it took to handle the
+            request.
+        :param str error: Optional. Kind of error, eg. `not_found`.
+        '''
+        labels = (('route', route), ('provider', provider))
+        bucket = bisect.bisect_left(self.buckets, duration)
+        with self._lock:
+            key = ('skosprovider_requests_total', labels + (('status', str(status)),))
+            self._counters[key] = self._counters.get(key, 0) + 1
+            if error is not None:
+                key = ('skosprovider_errors_total', labels + (('error', error),))
+                self._counters[key] = self._counters.get(key, 0) + 1
+            key = ('skosprovider_request_duration_seconds', labels)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[bucket] += 1
+            histogram[-1] += duration
+
+    def count_error(self, route, provider, error):
+        '''
+        Record an error that did not make the request fail.
+
+        :param str route: Name of the route that handled the request.
+        :param str provider: Id of the provider that failed.
+        :param str error: Kind of error, eg. `ProviderUnavailableException`.
+        '''
+        key = (
+            'skosprovider_errors_total',
+            (('route', route), ('provider', provider), ('error', error))
+        )
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def snapshot(self, registry=None):
+        '''
+        Get the metrics of this process.
+
+        :param registry: Optional. The Pyramid registry whose caches are
+            included.
+        :rtype: :class:`dict` that can be serialised to json.
+        '''
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, list(labels), list(h)] for (name, labels), h in self._histograms.items()]
+        gauges = []
+        if registry is not None:
+            for name, cache in registry.getUtilitiesFor(ISkosCache):
+                stats = cache.stats()
+                labels = [('cache', name)]
+                counters.append(['skosprovider_cache_hits_total', labels, stats['hits']])
+                counters.append(['skosprovider_cache_misses_total', labels, stats['misses']])
+                gauges.append(['skosprovider_cache_entries', labels, stats['entries']])
+        return {
+            'buckets': list(self.buckets),
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms
+        }
+
+    def maybe_flush(self, registry=None):
+        '''
+        Write the metrics of this process to the shared directory if they
+        haven't been written recently.
+
+        :param registry: Optional. The Pyramid registry whose caches are
+            included.
+        '''
+        if self.multiprocess_dir is None or \
+                time.monotonic() - self._flushed < self.flush_interval:
+            return
+        # Only one thread writes, the others don't wait for it
+        if self._flush_lock.acquire(blocking=False):
+            try:
+                self._write(registry)
+            finally:
+                self._flush_lock.release()
+
+    def flush(self, registry=None):
+        '''
+        Write the metrics of this process to the shared directory.
+
+        :param registry: Optional. The Pyramid registry whose caches are
+            included.
+        '''
+        with self._flush_lock:
+            self._write(registry)
+
+    def _write(self, registry):
+        self._flushed = time.monotonic()
+        path = os.path.join(self.multiprocess_dir, 'skosprovider-%d.json' % os.getpid())
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(self.snapshot(registry), f)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            log.warning('Could not write metrics to %s: %s', path, e)
+
+    def collect(self, registry=None):
+        '''
+        Get the metrics of all processes.
+
+        :param registry: Optional. The Pyramid registry whose caches are
+            included.
+        :rtype: :class:`list` of snapshots as returned by :meth:`snapshot`.
+            Snapshots of workers that have exited have no gauges and `live`
+            set to `False`.
+        '''
+        if self.multiprocess_dir is None:
+            return [self.snapshot(registry)]
+        self.flush(registry)
+        snapshots = []
+        for path in glob.glob(os.path.join(self.multiprocess_dir, 'skosprovider-*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning('Could not read metrics from %s: %s', path, e)
+                continue
+            if not _is_alive(_pid(path)):
+                # The caches of this worker no longer exist
+                snapshot['gauges'] = []
+                snapshot['live'] = False
+            snapshots.append(snapshot)
+        return snapshots
+
+    def render(self, registry=None):
+        '''
+        Render the metrics of all processes in the Prometheus text format.
+
+        :param registry: Optional. The Pyramid registry whose caches are
+            included.
+        :rtype: :class:`str`
+        '''
+        counters = {}
+        gauges = {}
+        histograms = {}
+        # Hits and misses of the caches that still exist
+        lookups = {}
+        for snapshot in self.collect(registry):
+            if tuple(snapshot['buckets']) != self.buckets:
+                continue
+            for values, target in ((snapshot['counters'], counters), (snapshot['gauges'], gauges)):
+                for name, labels, value in values:
+                    key = (name, tuple(tuple(label) for label in labels))
+                    target[key] = target.get(key, 0) + value
+                    if snapshot.get('live', True) and name in (
+                        'skosprovider_cache_hits_total', 'skosprovider_cache_misses_total'
+                    ):
+                        lookups[key] = lookups.get(key, 0) + value
+            for name, labels, h in snapshot['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                total = histograms.setdefault(key, [0] * len(h))
+                for i, value in enumerate(h):
+                    total[i] += value
+        for (name, labels), hits in lookups.items():
+            if name == 'skosprovider_cache_hits_total':
+                misses = lookups.get(('skosprovider_cache_misses_total', labels), 0)
+                if hits + misses:
+                    gauges[('skosprovider_cache_hit_ratio', labels)] = hits / (hits + misses)
+
+        lines = []
+        for name in HELP:
+            samples = [(labels, v) for (n, labels), v in sorted(counters.items()) if n == name]
+            samples += [(labels, v) for (n, labels), v in sorted(gauges.items()) if n == name]
+            samples += [(labels, v) for (n, labels), v in sorted(histograms.items()) if n == name]
+            if not samples:
+                continue
+            type, help = HELP[name]
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, type))
+            for labels, value in samples:
+                if type == 'histogram':
+                    lines.extend(self._render_histogram(name, labels, value))
+                else:
+                    lines.append('%s%s %s' % (name, _labels(labels), _number(value)))
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(self, name, labels, histogram):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), histogram):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else _number(bound)
+            yield '%s_bucket%s %d' % (name, _labels(labels + (('le', le),)), cumulative)
+        yield '%s_sum%s %s' % (name, _labels(labels), _number(histogram[-1]))
+        yield '%s_count%s %d' % (name, _labels(labels), cumulative)
+
+
+def _pid(path):
+    try:
+        return int(os.path.basename(path)[len('skosprovider-'):-len('.json')])
+    except ValueError:
+        return None
+
+
+def _is_alive(pid):
+    '''
+    Is the process with this id still running?
+
+    Processes that can't be checked are considered to be running.
+    '''
+    if pid is None or pid == os.getpid() or os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _labels(labels):
+    return '{%s}' % ','.join(
+        '%s="%s"' % (
+            key,
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        )
+        for key, value in labels
+    )
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _route_name(request):
+    route = getattr(request, 'matched_route', None)
+    if route is None or not route.name.startswith('skosprovider.') or \
+            route.name == 'skosprovider.metrics':
+        return None
+    return route.name
+
+
+def _provider_label(request):
+    scheme_id = (request.matchdict or {}).get('scheme_id')
+    if scheme_id is None:
+        return ''
+    # Only use providers that exist, so unknown ids don't add new series
+    skos_registry = request.__dict__.get('skos_registry')
+    if skos_registry is not None and skos_registry.get_provider(scheme_id):
+        return scheme_id
+    return ''
+
+
+def metrics_tween_factory(handler, registry):
+    '''
+    A Pyramid tween that records every request handled by a
+    pyramid_skosprovider route.
+    '''
+    metrics = registry.queryUtility(ISkosMetrics)
+    if metrics is None:
+        return handler
+
+    def metrics_tween(request):
+        start = time.perf_counter()
+        try:
+            response = handler(request)
+        except Exception as e:
+            route = _route_name(request)
+            if route is not None:
+                metrics.observe(
+                    route, _provider_label(request), 500,
+                    time.perf_counter() - start, e.__class__.__name__
+                )
+                metrics.maybe_flush(registry)
+            raise
+        route = _route_name(request)
+        if route is not None:
+            error = None
+            if isinstance(getattr(request, 'exception', None), ProviderUnavailableException):
+                error = 'ProviderUnavailableException'
+            elif response.status_code == 404:
+                error = 'not_found'
+            metrics.observe(
+                route, _provider_label(request), response.status_code,
+                time.perf_counter() - start, error
+            )
+            metrics.maybe_flush(registry)
+        return response
+
+    return metrics_tween
+
+
+def count_error(request, provider, error):
+    '''
+    Record an error that did not make the request fail, if metrics are
+    enabled.
+
+    :param request: The Pyramid request.
+    :param str provider: Id of the provider that failed.
+    :param str error: Kind of error, eg. `ProviderUnavailableException`.
+    '''
+    metrics = request.registry.queryUtility(ISkosMetrics)
+    route = _route_name(request)
+    if metrics is not None and route is not None:
+        metrics.count_error(route, str(provider), error)
+
+
+def metrics_view(request):
+    '''
+    Expose the metrics in the Prometheus text format.
+    '''
+    metrics = request.registry.getUtility(ISkosMetrics)
+    response = Response(body=metrics.render(request.registry).encode('utf-8'))
+    response.headers['Content-Type'] = CONTENT_TYPE
+    return response
+
+
+def get_metrics(registry):
+    '''
+    Get the :class:`Metrics` configured for this application.
+
+    :param registry: The Pyramid registry.
+    :returns: A :class:`Metrics` or `None` if metrics are not enabled.
+    '''
+    return registry.queryUtility(ISkosMetrics)
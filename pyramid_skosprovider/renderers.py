@@ -3,6 +3,12 @@
 This module contains function for rendering SKOS objects to JSON.
 '''
 
+import itertools
+import json
+
+from zope.interface import Interface
+
+from pyramid.decorator import reify
 from pyramid.renderers import JSON
 
 from skosprovider.skos import (
@@ -19,12 +25,129 @@ from skosprovider.jsonld import (
     jsonld_conceptscheme_dumper,
 )
 
+from pyramid_skosprovider.timing import timed
+
+from pyramid_skosprovider.utils import provider_implements
+
 import logging
 log = logging.getLogger(__name__)
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 json_renderer = JSON()
 
 
+def orjson_dumps(obj, default=None, **kw):
+    '''
+    Serialise an object with `orjson`.
+
+    Takes the same arguments as :func:`json.dumps`, but other keyword
+    arguments are ignored. The result is the same JSON, but it's more
+    compact and non ASCII characters are not escaped.
+
+    :rtype: :class:`str`
+    '''
+    return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+
+def get_serializer(backend='json'):
+    '''
+    Get the function a JSON backend serialises objects with.
+
+    :param str backend: `json` for the standard library, `orjson` for
+        `orjson` or `auto` to use `orjson` if it's installed and the standard
+        library otherwise.
+    :returns: A function that takes the same arguments as
+        :func:`json.dumps`.
+    '''
+    if backend == 'auto':
+        backend = 'json' if orjson is None else 'orjson'
+    if backend == 'json':
+        return json.dumps
+    if backend == 'orjson':
+        if orjson is None:
+            raise ImportError('The orjson JSON backend requires orjson to be installed.')
+        return orjson_dumps
+    raise ValueError('Unknown JSON backend: %s' % backend)
+
+
+def with_serializer(renderer, serializer):
+    '''
+    Get a renderer that uses the adapters of another renderer, but a
+    different serializer.
+
+    :param pyramid.renderers.JSON renderer: The renderer whose adapters are
+        used, eg. :data:`json_renderer`.
+    :param callable serializer: Takes the same arguments as
+        :func:`json.dumps`.
+    :rtype: :class:`pyramid.renderers.JSON`
+    '''
+    if serializer is renderer.serializer:
+        return renderer
+    r = JSON(serializer=serializer, **renderer.kw)
+    r.components = renderer.components
+    return r
+
+
+class RenderContext(object):
+    '''
+    Values that every object rendered for a request needs.
+
+    They are looked up once per request instead of once for every concept
+    or collection that is rendered.
+
+    :param pyramid.request.Request request: The request being rendered.
+    '''
+
+    def __init__(self, request):
+        self.request = request
+        self._providers = {}
+
+    @reify
+    def language(self):
+        '''
+        The language labels are rendered in.
+        '''
+        return self.request.params.get('language', self.request.locale_name)
+
+    @reify
+    def context(self):
+        '''
+        URL of the JSON-LD context.
+        '''
+        return self.request.route_url('skosprovider.context')
+
+    def get_provider(self, id):
+        '''
+        Get a provider from the registry of the request.
+
+        :param id: Id or URI of the provider.
+        :returns: A :class:`skosprovider.providers.VocabularyProvider` or
+            `False` if the provider could not be found.
+        '''
+        try:
+            return self._providers[id]
+        except KeyError:
+            p = self._providers[id] = self.request.skos_registry.get_provider(id)
+            return p
+
+
+def get_render_context(request):
+    '''
+    Get the :class:`RenderContext` of a request.
+
+    :param pyramid.request.Request request:
+    :rtype: :class:`RenderContext`
+    '''
+    context = request.__dict__.get('skos_render_context')
+    if context is None:
+        context = request.__dict__['skos_render_context'] = RenderContext(request)
+    return context
+
+
 def concept_adapter(obj, request):
     '''
     Adapter for rendering a :class:`skosprovider.skos.Concept` to json.
@@ -32,9 +155,14 @@ def concept_adapter(obj, request):
     :param skosprovider.skos.Concept obj: The concept to be rendered.
     :rtype: :class:`dict`
     '''
-    p = request.skos_registry.get_provider(obj.concept_scheme.uri)
-    language = request.params.get('language', request.locale_name)
+    render = get_render_context(request)
+    p = render.get_provider(obj.concept_scheme.uri)
+    language = render.language
     label = obj.label(language)
+    relations = _get_by_ids(p, itertools.chain(
+        obj.narrower, obj.broader, obj.related,
+        obj.member_of, obj.subordinate_arrays
+    ), request)
     return {
         'id': obj.id,
         'type': 'concept',
@@ -47,11 +175,11 @@ def concept_adapter(obj, request):
         'labels': obj.labels,
         'notes': obj.notes,
         'sources': obj.sources,
-        'narrower': _map_relations(obj.narrower, p, language),
-        'broader': _map_relations(obj.broader, p, language),
-        'related': _map_relations(obj.related, p, language),
-        'member_of': _map_relations(obj.member_of, p, language),
-        'subordinate_arrays':  _map_relations(obj.subordinate_arrays, p, language),
+        'narrower': _map_relations(obj.narrower, p, language, relations),
+        'broader': _map_relations(obj.broader, p, language, relations),
+        'related': _map_relations(obj.related, p, language, relations),
+        'member_of': _map_relations(obj.member_of, p, language, relations),
+        'subordinate_arrays':  _map_relations(obj.subordinate_arrays, p, language, relations),
         'matches': obj.matches
     }
 
@@ -63,9 +191,13 @@ def collection_adapter(obj, request):
     :param skosprovider.skos.Collection obj: The collection to be rendered.
     :rtype: :class:`dict`
     '''
-    p = request.skos_registry.get_provider(obj.concept_scheme.uri)
-    language = request.params.get('language', request.locale_name)
+    render = get_render_context(request)
+    p = render.get_provider(obj.concept_scheme.uri)
+    language = render.language
     label = obj.label(language)
+    relations = _get_by_ids(p, itertools.chain(
+        obj.members, obj.member_of, obj.superordinates
+    ), request)
     return {
         'id': obj.id,
         'type': 'collection',
@@ -78,30 +210,64 @@ def collection_adapter(obj, request):
         'labels': obj.labels,
         'notes': obj.notes,
         'sources': obj.sources,
-        'members': _map_relations(obj.members, p, language),
-        'member_of': _map_relations(obj.member_of, p, language),
-        'superordinates':  _map_relations(obj.superordinates, p, language),
+        'members': _map_relations(obj.members, p, language, relations),
+        'member_of': _map_relations(obj.member_of, p, language, relations),
+        'superordinates':  _map_relations(obj.superordinates, p, language, relations),
         'infer_concept_relations': obj.infer_concept_relations
     }
 
 
-def _map_relations(relations, p, language='any'):
+def _get_by_ids(p, ids, request=None):
+    '''
+    Look up a number of concepts or collections in a single pass.
+
+    If the provider has a `get_by_ids` method, all id's are resolved with one
+    call. Otherwise every id is looked up with `get_by_id`.
+
+    :param: :class:`skosprovider.providers.VocabularyProvider` p: Provider
+        to look up id's.
+    :param ids: An iterable of concept or collection id's.
+    :param request: Optional. The request the lookups are timed for.
+    :rtype: :class:`dict` mapping the string representation of every id
+        that was found to the concept or collection.
+    '''
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+    if provider_implements(p, 'get_by_ids'):
+        with timed(request, 'get_by_ids'):
+            return {str(c.id): c for c in p.get_by_ids(ids) if c}
+    found = {}
+    for id in ids:
+        with timed(request, 'get_by_id'):
+            c = p.get_by_id(id)
+        if c:
+            found[str(id)] = c
+    return found
+
+
+def _map_relations(relations, p, language='any', lookup=None):
     '''
     :param: :class:`list` relations: Relations to be mapped. These are
         concept or collection id's.
     :param: :class:`skosprovider.providers.VocabularyProvider` p: Provider
         to look up id's.
     :param string language: Language to render the relations' labels in
+    :param dict lookup: Optional. Concepts and collections that were already
+        resolved by :func:`_get_by_ids`. If not present, the relations will be
+        looked up in the provider.
     :rtype: :class:`list`
     '''
+    if lookup is None:
+        lookup = _get_by_ids(p, relations)
     ret = []
     for r in relations:
-        c = p.get_by_id(r)
+        c = lookup.get(str(r))
         if c:
             ret.append(_map_relation(c, language))
         else:
             log.warning(
-                'A relation references a concept or collection %d in provider %s that can not be found. Please check the integrity of your data.' %
+                'A relation references a concept or collection %s in provider %s that can not be found. Please check the integrity of your data.' %
                 (r, p.get_vocabulary_id())
             )
     return ret
@@ -173,6 +339,55 @@ json_renderer.add_adapter(Note, note_adapter)
 json_renderer.add_adapter(Source, source_adapter)
 
 
+class IJSONStream(Interface):
+    pass
+
+
+class JSONStream(object):
+    '''
+    Renders a list of results as a JSON array, a few results at a time. This
+    way a large list never needs to be rendered to a single string.
+
+    The output is identical to the output of the JSON renderer that is
+    wrapped.
+
+    :param pyramid.renderers.JSON renderer: The renderer used to encode each
+        result.
+    :param int chunk_size: Number of results to encode at a time.
+    '''
+
+    def __init__(self, renderer=json_renderer, chunk_size=500):
+        self.renderer = renderer
+        self.chunk_size = chunk_size
+
+    def app_iter(self, results, request):
+        '''
+        Encode results as a JSON array.
+
+        :param results: An iterable of results.
+        :param pyramid.request.Request request: The current request.
+        :returns: A generator of :class:`bytes`, suitable as a response's
+            `app_iter`.
+        '''
+        default = self.renderer._make_default(request)
+        serializer = self.renderer.serializer
+        kw = self.renderer.kw
+        # Separate the results like the serializer separates list items
+        comma = serializer([0, 0], **kw)[2:-2]
+        separator = ''
+        yield b'['
+        chunk = []
+        for r in results:
+            chunk.append(serializer(r, default=default, **kw))
+            if len(chunk) >= self.chunk_size:
+                yield (separator + comma.join(chunk)).encode('utf-8')
+                separator = comma
+                chunk = []
+        if chunk:
+            yield (separator + comma.join(chunk)).encode('utf-8')
+        yield b']'
+
+
 jsonld_renderer = JSON()
 
 
@@ -183,11 +398,11 @@ def conceptscheme_ld_adapter(obj, request):
     :param skosprovider.skos.ConceptScheme obj: The conceptscheme to be rendered.
     :rtype: :class:`dict`
     '''
-    p = request.skos_registry.get_provider(obj.uri)
-    language = request.params.get('language', request.locale_name)
+    render = get_render_context(request)
+    p = render.get_provider(obj.uri)
     request.response.content_type = 'application/ld+json'
-    context = request.route_url('skosprovider.context')
-    return jsonld_conceptscheme_dumper(p, context, language=language)
+    with timed(request, 'jsonld'):
+        return jsonld_conceptscheme_dumper(p, render.context, language=render.language)
 
 
 def concept_ld_adapter(obj, request):
@@ -197,11 +412,11 @@ def concept_ld_adapter(obj, request):
     :param skosprovider.skos.Concept obj: The concept to be rendered.
     :rtype: :class:`dict`
     '''
-    p = request.skos_registry.get_provider(obj.concept_scheme.uri)
-    language = request.params.get('language', request.locale_name)
+    render = get_render_context(request)
+    p = render.get_provider(obj.concept_scheme.uri)
     request.response.content_type = 'application/ld+json'
-    context = request.route_url('skosprovider.context')
-    return jsonld_c_dumper(p, obj.id, context, language=language)
+    with timed(request, 'jsonld'):
+        return jsonld_c_dumper(p, obj.id, render.context, language=render.language)
 
 
 def collection_ld_adapter(obj, request):
@@ -211,11 +426,11 @@ def collection_ld_adapter(obj, request):
     :param skosprovider.skos.Concept obj: The concept to be rendered.
     :rtype: :class:`dict`
     '''
-    p = request.skos_registry.get_provider(obj.concept_scheme.uri)
-    language = request.params.get('language', request.locale_name)
+    render = get_render_context(request)
+    p = render.get_provider(obj.concept_scheme.uri)
     request.response.content_type = 'application/ld+json'
-    context = request.route_url('skosprovider.context')
-    return jsonld_c_dumper(p, obj.id, context, language=language)
+    with timed(request, 'jsonld'):
+        return jsonld_c_dumper(p, obj.id, render.context, language=render.language)
 
 
 jsonld_renderer.add_adapter(ConceptScheme, conceptscheme_ld_adapter)
@@ -0,0 +1,117 @@
+# -*- coding: utf8 -*-
+'''
+This module measures how much time a request spends in providers, in
+building JSON-LD and in rendering.
+'''
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+
+class Timings(object):
+    '''
+    Counts the calls made while handling a request and how long they took.
+
+    Timings can be added from several threads at the same time.
+    '''
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, name):
+        '''
+        Time a block of code.
+
+        :param str name: Name of the call being timed, eg. `find`.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, duration):
+        '''
+        Record a call.
+
+        :param str name: Name of the call.
+        :param float duration: Number of seconds the call took.
+        '''
+        with self._lock:
+            count, total = self.entries.get(name, (0, 0.0))
+            self.entries[name] = (count + 1, total + duration)
+
+    def header(self):
+        '''
+        Build a `Server-Timing` header.
+
+        :rtype: :class:`str` with a metric for every name that was timed.
+            The duration is the total in milliseconds.
+        '''
+        with self._lock:
+            return ', '.join(
+                '%s;desc="%d call%s";dur=%.3f' % (
+                    name, count, '' if count == 1 else 's', total * 1000
+                )
+                for name, (count, total) in self.entries.items()
+            )
+
+
+def get_timings(request):
+    '''
+    Get the :class:`Timings` for a request. They are sent to the client in a
+    `Server-Timing` header.
+
+    :param request: The Pyramid request.
+    :rtype: :class:`Timings`
+    '''
+    timings = Timings()
+
+    def add_header(request, response):
+        if timings.entries:
+            header = timings.header()
+            if 'Server-Timing' in response.headers:
+                header = response.headers['Server-Timing'] + ', ' + header
+            response.headers['Server-Timing'] = header
+
+    request.add_response_callback(add_header)
+    return timings
+
+
+def timed(request, name):
+    '''
+    Time a block of code if timing is enabled for this request.
+
+    :param request: The Pyramid request or `None`.
+    :param str name: Name of the call being timed, eg. `find`.
+    :returns: A context manager.
+    '''
+    timings = getattr(request, 'skos_timings', None)
+    if timings is None:
+        return nullcontext()
+    return timings.timed(name)
+
+
+def timed_renderer(factory, name='render'):
+    '''
+    Wrap a renderer factory so the time spent rendering is recorded.
+
+    :param factory: A Pyramid renderer factory, eg. a
+        :class:`pyramid.renderers.JSON`.
+    :param str name: Name the rendering time is recorded under.
+    :returns: A renderer factory.
+    '''
+    def renderer_factory(info):
+        render = factory(info)
+
+        def _render(value, system):
+            with timed(system.get('request'), name):
+                return render(value, system)
+
+        return _render
+
+    return renderer_factory
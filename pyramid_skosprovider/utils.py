@@ -63,6 +63,20 @@ class QueryBuilder:
         return q
 
 
+def provider_implements(provider, method):
+    '''
+    Check if a provider implements an optional method.
+
+    The method is looked up on the class of the provider, so only providers
+    that actually define the method are considered to support it.
+
+    :param provider: A :class:`skosprovider.providers.VocabularyProvider`.
+    :param str method: Name of the method, eg. `get_by_ids`.
+    :rtype: boolean
+    '''
+    return callable(getattr(type(provider), method, None))
+
+
 def parse_range_header(range):
     '''
     Parse a range header as used by the dojo Json Rest store.
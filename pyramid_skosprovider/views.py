@@ -3,19 +3,53 @@
 This module contains the pyramid views that expose services.
 '''
 
+import copy
 import itertools
+import json
+import threading
 
+from zope.interface import Interface
+
+from pyramid.renderers import render
+from pyramid.request import apply_request_extensions
 from pyramid.view import view_config, view_defaults
 
+from webob.datetime_utils import (
+    parse_date,
+    serialize_date
+)
+
 from pyramid.httpexceptions import (
+    HTTPException,
     HTTPNotFound,
+    HTTPNotModified,
     HTTPBadRequest
 )
 
 from skosprovider.exceptions import ProviderUnavailableException
 
+from pyramid_skosprovider.cache import (
+    get_cache,
+    get_single_flight
+)
+
+from pyramid_skosprovider.fanout import get_fanout
+
+from pyramid_skosprovider.indexes import get_indexes
+
+from pyramid_skosprovider.metrics import count_error
+
+from pyramid_skosprovider.renderers import (
+    IJSONStream,
+    _get_by_ids,
+    get_render_context
+)
+
+from pyramid_skosprovider.timing import timed
+
 from pyramid_skosprovider.utils import (
     parse_range_header,
+    provider_implements,
     QueryBuilder
 )
 
@@ -27,6 +61,69 @@ from skosprovider.jsonld import (
 import logging
 log = logging.getLogger(__name__)
 
+BULK_MAX_ITEMS = 200
+'''
+Default maximum number of concepts and collections that can be requested at
+once through the bulk services.
+'''
+
+
+class IBulkMaxItems(Interface):
+    pass
+
+
+def get_bulk_max_items(registry):
+    '''
+    Get the maximum number of items that can be requested through the bulk
+    services.
+
+    :param registry: The Pyramid registry.
+    :rtype: :class:`int`
+    '''
+    return registry.queryUtility(IBulkMaxItems, default=BULK_MAX_ITEMS)
+
+
+def _is_identifier(value):
+    '''
+    Can a value sent by a client be used as the id of a conceptscheme, concept
+    or collection?
+    '''
+    return isinstance(value, (str, int)) and not isinstance(value, bool)
+
+
+def _mini_context(**terms):
+    '''
+    Build a JSON-LD context with the terms of
+    :data:`skosprovider.jsonld.MINI_CONTEXT` and a few extra terms.
+
+    The contexts are built once and shared by all requests, so they must not
+    be changed.
+    '''
+    context = copy.deepcopy(MINI_CONTEXT)
+    context.update(terms)
+    return context
+
+
+URI_CONTEXT = _mini_context(concept_scheme={'@id': 'skos:inScheme', '@type': '@id'})
+'''
+JSON-LD context of a concept or collection found through :http:get:`/uris`.
+'''
+
+URI_CONCEPTSCHEME_CONTEXT = _mini_context(concept_scheme='skos:ConceptScheme')
+'''
+JSON-LD context of a conceptscheme found through :http:get:`/uris`.
+'''
+
+CONCEPTSCHEMES_CONTEXT = _mini_context(subject={'@id': 'dct:subject', '@type': '@id'})
+'''
+JSON-LD context of the conceptschemes listed by :http:get:`/conceptschemes`.
+'''
+
+RENDERER_CONTENT_TYPES = {
+    'skosjson': 'application/json',
+    'skosjsonld': 'application/ld+json'
+}
+
 
 class RestView(object):
 
@@ -63,6 +160,12 @@ class ProviderView(RestView):
     A set of views that expose information from a certain provider.
     '''
 
+    skipped_providers = ()
+    '''
+    Ids of the providers that were left out of the results because they
+    failed or took too long to answer.
+    '''
+
     @view_config(
         route_name='skosprovider.uri',
         request_method='GET',
@@ -88,24 +191,40 @@ class ProviderView(RestView):
         if 'application/ld+json' in self.request.accept:
             self.request.response.content_type = 'application/ld+json'
         provider = self.skos_registry.get_provider(uri)
-        uri_context = MINI_CONTEXT
-        uri_context['concept_scheme'] = {
-            '@id': 'skos:inScheme',
-            '@type': '@id'
-        }
         if provider:
-            uri_context['concept_scheme'] = 'skos:ConceptScheme'
             return {
-                '@context': uri_context,
+                '@context': URI_CONCEPTSCHEME_CONTEXT,
                 'type': 'concept_scheme',
                 'uri': provider.concept_scheme.uri,
                 'id': provider.get_vocabulary_id()
             }
-        c = self.skos_registry.get_by_uri(uri)
+        indexes = self._indexes()
+        if indexes is not None:
+            with timed(self.request, 'get_by_uri'):
+                found = self._coalesced(
+                    ('uri', uri),
+                    lambda: indexes.resolve_uri(self.skos_registry, uri)
+                )
+            if not found:
+                return HTTPNotFound()
+            provider, id, type = found
+            return {
+                '@context': URI_CONTEXT,
+                'type': type,
+                'uri': uri,
+                'id': id,
+                'concept_scheme': {
+                    'type': 'skos:ConceptScheme',
+                    'uri': provider.concept_scheme.uri,
+                    'id': provider.get_vocabulary_id()
+                }
+            }
+        with timed(self.request, 'get_by_uri'):
+            c = self._coalesced(('uri', uri), lambda: self.skos_registry.get_by_uri(uri))
         if not c:
             return HTTPNotFound()
         return {
-            '@context': uri_context,
+            '@context': URI_CONTEXT,
             'type': c.type,
             'uri': c.uri,
             'id': c.id,
@@ -128,26 +247,35 @@ class ProviderView(RestView):
         accept='application/ld+json'
     )
     def get_conceptschemes(self):
-        language = self.request.params.get('language', self.request.locale_name)
+        language = get_render_context(self.request).language
         if 'application/ld+json' in self.request.accept:
             self.request.response.content_type = 'application/ld+json'
-        context = MINI_CONTEXT
-        context['subject'] = {
-            '@id': 'dct:subject',
-            '@type': '@id'
-        }
+        providers = self.skos_registry.get_providers()
+        cache = get_cache(self.request.registry, 'conceptschemes')
+        if cache is not None:
+            key = (language, cache.fingerprint(
+                providers, self.skos_registry.instance_scope != 'threaded_thread'
+            ))
+            conceptschemes = cache.get(key)
+            if conceptschemes is not None:
+                return conceptschemes
         conceptschemes = []
-        for p in self.skos_registry.get_providers():
+        for p in providers:
             try:
                 if label := p.concept_scheme.label(language):
                     cslabel = label.label
                 else:
                     cslabel = p.get_vocabulary_uri()
+                if cache is not None:
+                    cache.remember_label(p.get_vocabulary_id(), language, cslabel)
             except ProviderUnavailableException as e:
                 log.error(f'Could not fetch label for {p.get_vocabulary_uri()}: %s', e)
+                count_error(self.request, p.get_vocabulary_id(), 'ProviderUnavailableException')
                 cslabel = p.get_vocabulary_uri()
+                if cache is not None:
+                    cslabel = cache.last_label(p.get_vocabulary_id(), language, cslabel)
             cs = {
-                '@context': context,
+                '@context': CONCEPTSCHEMES_CONTEXT,
                 'type': 'skos:ConceptScheme',
                 'id': p.get_vocabulary_id(),
                 'uri': p.get_vocabulary_uri(),
@@ -155,6 +283,8 @@ class ProviderView(RestView):
                 'subject': p.metadata['subject'] if p.metadata['subject'] else []
             }
             conceptschemes.append(cs)
+        if cache is not None:
+            cache.set(key, conceptschemes)
         return conceptschemes
 
     @view_config(
@@ -168,7 +298,10 @@ class ProviderView(RestView):
         provider = self.skos_registry.get_provider(scheme_id)
         if not provider:
             return HTTPNotFound()
-        language = self.request.params.get('language', self.request.locale_name)
+        not_modified = self._conditional(provider)
+        if not_modified:
+            return not_modified
+        language = get_render_context(self.request).language
         return {
             'id': provider.get_vocabulary_id(),
             'uri': provider.concept_scheme.uri,
@@ -196,6 +329,9 @@ class ProviderView(RestView):
         provider = self.skos_registry.get_provider(scheme_id)
         if not provider:
             return HTTPNotFound()
+        not_modified = self._conditional(provider)
+        if not_modified:
+            return not_modified
         return provider.concept_scheme
 
     @view_config(
@@ -209,8 +345,16 @@ class ProviderView(RestView):
         provider = self.skos_registry.get_provider(scheme_id)
         if not provider:
             return HTTPNotFound()
-        language = self.request.params.get('language', self.request.locale_name)
-        return provider.get_top_concepts(language=language)
+        not_modified = self._conditional(provider)
+        if not_modified:
+            return not_modified
+        language = get_render_context(self.request).language
+
+        def lookup():
+            with timed(self.request, 'get_top_concepts'):
+                return provider.get_top_concepts(language=language)
+
+        return self._render_cached(('top_concepts', scheme_id), 'skosjson', lookup)
 
     @view_config(
         route_name='skosprovider.conceptscheme.display_top',
@@ -223,8 +367,16 @@ class ProviderView(RestView):
         provider = self.skos_registry.get_provider(scheme_id)
         if not provider:
             return HTTPNotFound()
-        language = self.request.params.get('language', self.request.locale_name)
-        return provider.get_top_display(language=language)
+        not_modified = self._conditional(provider)
+        if not_modified:
+            return not_modified
+        language = get_render_context(self.request).language
+
+        def lookup():
+            with timed(self.request, 'get_top_display'):
+                return provider.get_top_display(language=language)
+
+        return self._render_cached(('top_display', scheme_id), 'skosjson', lookup)
 
     def _build_providers(self, request):
         '''
@@ -253,15 +405,41 @@ class ProviderView(RestView):
         query = qb()
         kwargs = {"language": qb.language, "providers": self._build_providers(self.request)}
         kwargs.update(self._get_sort_params())
+        fanout = get_fanout(self.request.registry)
         if qb.no_result:
             concepts = []
+        elif self._can_page_providers(qb):
+            providers = self.skos_registry.get_providers(**kwargs['providers'])
+            return self._page_providers(providers, query, {'language': qb.language}, fanout)
+        elif self._can_stream(qb) and fanout is None:
+            providers = self.skos_registry.get_providers(**kwargs['providers'])
+            return self._stream_providers(providers, query, {'language': qb.language})
         else:
-            concepts = self.skos_registry.find(query, **kwargs)
-            # Flatten it all
-            concepts = list(itertools.chain.from_iterable([c['concepts'] for c in concepts]))
-
-        if qb.postprocess:
-            concepts = self._postprocess_wildcards(concepts, qb.label)
+            def find():
+                if fanout is not None:
+                    concepts = self._fan_out(
+                        fanout,
+                        lambda p: {
+                            'id': p.get_vocabulary_id(),
+                            'concepts': self._provider_find(
+                                p, copy.deepcopy(query), qb, language=qb.language
+                            )
+                        },
+                        self.skos_registry.get_providers(**kwargs['providers'])
+                    )
+                elif self._indexes() is not None:
+                    concepts = [
+                        {
+                            'id': p.get_vocabulary_id(),
+                            'concepts': self._provider_find(p, query, qb, language=qb.language)
+                        }
+                        for p in self.skos_registry.get_providers(**kwargs['providers'])
+                    ]
+                else:
+                    concepts = self.skos_registry.find(query, **kwargs)
+                # Flatten it all
+                return list(itertools.chain.from_iterable([c['concepts'] for c in concepts]))
+            concepts = self._find(None, qb, query, kwargs, find)
 
         return self._page_results(concepts)
 
@@ -282,14 +460,154 @@ class ProviderView(RestView):
         kwargs.update(self._get_sort_params())
         if qb.no_result:
             concepts = []
+        elif self._can_page_providers(qb):
+            return self._page_providers([provider], query, kwargs)
+        elif self._can_stream(qb):
+            return self._stream_providers([provider], query, kwargs)
         else:
-            concepts = provider.find(query, **kwargs)
-
-        if qb.postprocess:
-            concepts = self._postprocess_wildcards(concepts, qb.label)
+            concepts = self._find(
+                scheme_id, qb, query, kwargs,
+                lambda: self._provider_find(provider, query, qb, **kwargs)
+            )
 
         return self._page_results(concepts)
 
+    def _find(self, scope, qb, query, kwargs, find):
+        '''
+        Execute a query, using the query cache if it's enabled.
+
+        Identical queries that run at the same time share one execution when
+        lookups are coalesced.
+
+        :param scope: The id of the conceptscheme being searched or `None` when
+            searching the entire registry.
+        :param pyramid_skosprovider.utils.QueryBuilder qb: The query builder
+            that generated the query.
+        :param dict query: The query to execute.
+        :param dict kwargs: The keyword arguments passed along with the query.
+        :param callable find: Executes the query.
+        :rtype: :class:`list`
+        '''
+        cache = self._query_cache()
+        # Providers are allowed to modify the query, so build the key first
+        key = (
+            scope,
+            json.dumps(query, sort_keys=True),
+            json.dumps(kwargs, sort_keys=True),
+            qb.label if qb.postprocess else None
+        )
+        if cache is not None:
+            concepts = cache.get(key)
+            if concepts is not None:
+                return concepts
+
+        def run():
+            with timed(self.request, 'find'):
+                concepts = find()
+            if qb.postprocess:
+                concepts = self._postprocess_wildcards(concepts, qb.label)
+            return concepts, self.skipped_providers
+
+        concepts, skipped = self._coalesced(('find',) + key, run)
+        if skipped and not self.skipped_providers:
+            # Another request ran the query
+            self._skip(skipped)
+        if cache is not None and not skipped:
+            cache.set(key, concepts)
+        return concepts
+
+    def _query_cache(self):
+        '''
+        Get the query cache if it's enabled.
+
+        The cache is not used when the registry is attached to the request,
+        since the results depend on the registry.
+        '''
+        if self.skos_registry.instance_scope == 'threaded_thread':
+            return None
+        return get_cache(self.request.registry, 'query')
+
+    def _indexes(self):
+        '''
+        Get the indexes if they're enabled.
+
+        The indexes are not used when the registry is attached to the request.
+        Its providers are new for every request, so the indexes would be
+        rebuilt every time, and answers could be shared between registries.
+        '''
+        if self.skos_registry.instance_scope == 'threaded_thread':
+            return None
+        return get_indexes(self.request.registry)
+
+    def _coalesced(self, key, func):
+        '''
+        Call a function, sharing the call with identical requests that are
+        being handled at the same time if lookups are coalesced.
+
+        Lookups are not shared when the registry is attached to the request.
+
+        :param tuple key: Identifies the lookup.
+        :param callable func: Does the lookup. Its result is shared by several
+            requests, so it must not be specific to this request.
+        '''
+        flight = get_single_flight(self.request.registry)
+        if flight is None or self.skos_registry.instance_scope == 'threaded_thread':
+            return func()
+        return flight.do(key, func)
+
+    def _provider_find(self, p, query, qb, **kwargs):
+        '''
+        Search a provider, using the indexes if they are enabled.
+
+        :param p: The provider to search.
+        :param dict query: The query to execute.
+        :param pyramid_skosprovider.utils.QueryBuilder qb: The query builder
+            that generated the query.
+        :rtype: :class:`list`
+        '''
+        indexes = self._indexes()
+        if indexes is not None:
+            concepts = indexes.find(p, query, **self._label_hints(qb), **kwargs)
+            if concepts is not None:
+                return concepts
+        return p.find(query, **kwargs)
+
+    @staticmethod
+    def _label_hints(qb):
+        '''
+        Tell the indexes which labels :meth:`_postprocess_wildcards` will keep.
+        '''
+        if not qb.postprocess:
+            return {}
+        label = qb.label
+        if label.startswith('*') and not label.endswith('*'):
+            return {'endswith': label[1:]}
+        if label.endswith('*') and not label.startswith('*'):
+            return {'startswith': label[:-1]}
+        return {}
+
+    def _fan_out(self, fanout, func, providers):
+        '''
+        Call a function for a number of providers in parallel.
+
+        Providers that fail or are too late are reported in the
+        `X-Skosprovider-Skipped` response header.
+
+        :param pyramid_skosprovider.fanout.FanOut fanout:
+        :param callable func: Receives a provider as its only argument.
+        :param list providers: The providers to call.
+        :returns: A list with the result of every provider that answered.
+        '''
+        results, failed = fanout.map(func, providers)
+        if failed:
+            self._skip(failed)
+        return [r for p, r in results]
+
+    def _skip(self, failed):
+        self.skipped_providers = failed
+        self.request.response.headers['X-Skosprovider-Skipped'] = \
+            ', '.join(str(id) for id in failed)
+
     @staticmethod
     def _postprocess_wildcards(concepts, label):
         # We need to refine results further
@@ -313,11 +631,107 @@ class ProviderView(RestView):
             return {"sort": sort, "sort_order": sort_order}
         return {}
 
+    def _get_range(self):
+        '''
+        Get the range of results requested with a `Range` header.
+
+        :returns: A dict as returned by
+            :func:`pyramid_skosprovider.utils.parse_range_header` or `False` if
+            no valid range was requested.
+        '''
+        if 'Range' in self.request.headers:
+            return parse_range_header(self.request.headers['Range'])
+        return False
+
+    def _can_page_providers(self, qb):
+        '''
+        Can the requested range be passed on to the providers?
+
+        This is not possible when the results still need to be filtered or
+        when complete result sets are being cached.
+        '''
+        return (
+            bool(self._get_range()) and
+            not qb.postprocess and
+            self._query_cache() is None
+        )
+
+    def _can_stream(self, qb):
+        '''
+        Can the results be streamed to the client?
+
+        Only complete listings that need no further filtering and are not
+        cached are streamed.
+        '''
+        return (
+            self.request.registry.queryUtility(IJSONStream) is not None and
+            not self._get_range() and
+            not qb.postprocess and
+            self._query_cache() is None
+        )
+
+    def _stream_providers(self, providers, query, kwargs):
+        '''
+        Stream all results of a number of providers to the client.
+
+        Providers that implement `find_page` are asked for one chunk of results
+        at a time while the response is being sent, unless the registry is
+        attached to the request. The registry might no longer be usable by
+        then. Other providers are queried before the response is sent, but
+        their results are still encoded a chunk at a time.
+
+        :param list providers: The providers to query, in order.
+        :param dict query: The query to execute.
+        :param dict kwargs: The keyword arguments passed along with the query.
+        :rtype: :class:`pyramid.response.Response`
+        '''
+        stream = self.request.registry.queryUtility(IJSONStream)
+        lazy = self.skos_registry.instance_scope != 'threaded_thread'
+        sources = []
+        count = 0
+        for p in providers:
+            with timed(self.request, 'find'):
+                if lazy and provider_implements(p, 'find_page'):
+                    q = copy.deepcopy(query)
+                    concepts, total = p.find_page(q, 0, stream.chunk_size, **kwargs)
+                    sources.append(self._iter_pages(p, q, kwargs, concepts, total, stream.chunk_size))
+                else:
+                    concepts = p.find(query, **kwargs)
+                    total = len(concepts)
+                    sources.append(concepts)
+            count += total
+        response = self.request.response
+        response.content_type = 'application/json'
+        response.headers['Content-Range'] = 'items %d-%d/%d' % (
+            0, count - 1 if count > 0 else 0, count
+        )
+        response.app_iter = stream.app_iter(
+            self._add_context(itertools.chain.from_iterable(sources)),
+            self.request
+        )
+        return response
+
+    @staticmethod
+    def _iter_pages(p, query, kwargs, concepts, total, chunk_size):
+        offset = 0
+        while concepts:
+            yield from concepts
+            offset += len(concepts)
+            if offset >= total:
+                break
+            concepts, total = p.find_page(query, offset, chunk_size, **kwargs)
+
+    def _add_context(self, results):
+        context = get_render_context(self.request).context
+        for i, r in enumerate(results):
+            if i == 0:
+                r = dict(r)
+                r['@context'] = context
+            yield r
+
     def _page_results(self, concepts):
         # Result paging
-        paging_data = False
-        if 'Range' in self.request.headers:
-            paging_data = parse_range_header(self.request.headers['Range'])
+        paging_data = self._get_range()
         count = len(concepts)
         if not paging_data:
             paging_data = {
@@ -326,20 +740,189 @@ class ProviderView(RestView):
                 'number': count
             }
         cslice = concepts[paging_data['start']:paging_data['finish']+1]
+        return self._set_page(cslice, paging_data, count)
+
+    def _page_providers(self, providers, query, kwargs, fanout=None):
+        '''
+        Query a number of providers for the requested range of results.
+
+        Providers that implement a `find_page(query, offset, limit, **kwargs)`
+        method only return the results that are part of the range, together
+        with the total number of results. So do providers that are searched
+        with the indexes. Other providers return all results, which are then
+        sliced.
+
+        Identical requests for the same range that run at the same time share
+        one execution when lookups are coalesced.
+
+        :param list providers: The providers to query, in order.
+        :param dict query: The query to execute.
+        :param dict kwargs: The keyword arguments passed along with the query.
+        :param pyramid_skosprovider.fanout.FanOut fanout: Optional. If present,
+            all providers are queried in parallel for the results up to the
+            end of the range.
+        :rtype: :class:`list`
+        '''
+        indexes = self._indexes()
+
+        def fetch(p, query, offset, limit):
+            if provider_implements(p, 'find_page'):
+                return p.find_page(query, offset, limit, **kwargs)
+            if indexes is not None:
+                page = indexes.find_page(p, query, offset, limit, **kwargs)
+                if page is not None:
+                    return page
+            concepts = p.find(query, **kwargs)
+            return concepts[offset:offset + limit], len(concepts)
+
+        paging_data = self._get_range()
+        # Providers are allowed to modify the query, so build the key first
+        key = (
+            'page',
+            tuple(p.get_vocabulary_id() for p in providers),
+            json.dumps(query, sort_keys=True),
+            json.dumps(kwargs, sort_keys=True),
+            paging_data['start'],
+            paging_data['number']
+        )
+
+        def run():
+            cslice = []
+            count = 0
+            if fanout is None:
+                for p in providers:
+                    offset = max(paging_data['start'] - count, 0)
+                    limit = paging_data['number'] - len(cslice)
+                    with timed(self.request, 'find'):
+                        concepts, total = fetch(p, query, offset, limit)
+                    cslice.extend(concepts[:limit])
+                    count += total
+            else:
+                with timed(self.request, 'find'):
+                    pages = self._fan_out(
+                        fanout,
+                        lambda p: fetch(p, copy.deepcopy(query), 0, paging_data['finish'] + 1),
+                        providers
+                    )
+                for concepts, total in pages:
+                    offset = max(paging_data['start'] - count, 0)
+                    limit = paging_data['number'] - len(cslice)
+                    cslice.extend(concepts[offset:offset + limit])
+                    count += total
+            return cslice, count, self.skipped_providers
+
+        cslice, count, skipped = self._coalesced(key, run)
+        if skipped and not self.skipped_providers:
+            # Another request ran the query
+            self._skip(skipped)
+        # The slice might be shared with other requests
+        return self._set_page(list(cslice), paging_data, count)
+
+    def _set_page(self, cslice, paging_data, count):
         if len(cslice):
-            cslice[0]['@context'] = self.request.route_url('skosprovider.context')
+            # Don't modify the results, they might be cached
+            cslice[0] = dict(cslice[0])
+            cslice[0]['@context'] = get_render_context(self.request).context
         self.request.response.headers['Content-Range'] = \
             'items %d-%d/%d' % (
                 paging_data['start'], paging_data['finish'], count
             )
         return cslice
 
+    def _render_cached(self, key, renderer, lookup, not_modified=None):
+        '''
+        Render the result of a lookup, using the render cache if it's enabled.
+
+        When the cached representation is no longer valid but the cache
+        allows stale entries, the stale representation is sent right away
+        and refreshed in the background. When the registry is attached to
+        the request, the representation is refreshed first and the stale one
+        is only sent if the provider is unavailable.
+
+        :param tuple key: Identifies the representation that will be rendered.
+        :param str renderer: Name of the renderer, eg. `skosjson`.
+        :param callable lookup: Returns the object to be rendered or an
+            :class:`pyramid.httpexceptions.HTTPException`.
+        :param pyramid.httpexceptions.HTTPNotModified not_modified: Optional.
+            Returned instead of the representation once the lookup has found
+            something to render, eg. when the client's copy is still valid.
+        '''
+        cache = get_cache(self.request.registry, 'render')
+        if cache is None:
+            result = lookup()
+            if not_modified is not None and not isinstance(result, HTTPException):
+                return not_modified
+            return result
+        key = key + (renderer, get_render_context(self.request).language, self.request.application_url)
+        body = cache.get(key)
+        if body is None:
+            stale = cache.get_stale(key)
+            if stale is not None and self.skos_registry.instance_scope != 'threaded_thread':
+                # Don't make the client wait, refresh the entry afterwards
+                body, age = stale
+                if cache.start_refresh(key):
+                    self._refresh_in_background(cache, key, renderer, lookup)
+                self._set_stale(age, '110 - "Response is Stale"')
+            else:
+                try:
+                    result = lookup()
+                except ProviderUnavailableException as e:
+                    if stale is None:
+                        raise
+                    log.warning('Serving a stale response for %s: %s', key, e)
+                    body, age = stale
+                    self._set_stale(age, '111 - "Revalidation Failed"')
+                else:
+                    if isinstance(result, HTTPException):
+                        return result
+                    body = render(renderer, result, request=self.request)
+                    cache.set(key, body)
+        if not_modified is not None:
+            return not_modified
+        response = self.request.response
+        response.content_type = RENDERER_CONTENT_TYPES[renderer]
+        response.text = body
+        return response
+
+    def _set_stale(self, age, warning):
+        response = self.request.response
+        response.headers['Age'] = str(int(age))
+        response.headers['Warning'] = warning
+
+    def _refresh_in_background(self, cache, key, renderer, lookup):
+        '''
+        Replace a stale entry of the render cache in a background thread.
+
+        The entry is rendered for a copy of this request, because this
+        request is still being used to send the stale response.
+        '''
+        request = self.request.copy_get()
+        request.registry = self.request.registry
+        apply_request_extensions(request)
+
+        def refresh():
+            try:
+                result = lookup()
+                if isinstance(result, HTTPException):
+                    cache.invalidate(key)
+                else:
+                    cache.set(key, render(renderer, result, request=request))
+            except Exception as e:
+                log.warning('Could not refresh %s: %s', key, e)
+            finally:
+                cache.end_refresh(key)
+
+        threading.Thread(target=refresh, name='skosprovider-refresh', daemon=True).start()
+
     @view_config(
         route_name='skosprovider.c',
         request_method='GET',
         accept='application/json',
         renderer='skosjson'
     )
+    def get_concept(self):
+        return self._get_concept('skosjson')
+
     @view_config(
         route_name='skosprovider.c',
         request_method='GET',
@@ -351,16 +934,62 @@ class ProviderView(RestView):
         request_method='GET',
         renderer='skosjsonld'
     )
-    def get_concept(self):
+    def get_concept_jsonld(self):
+        return self._get_concept('skosjsonld')
+
+    def _get_concept(self, renderer):
         scheme_id = self.request.matchdict['scheme_id']
         concept_id = self.request.matchdict['c_id']
         provider = self.skos_registry.get_provider(scheme_id)
         if not provider:
             return HTTPNotFound()
-        concept = provider.get_by_id(concept_id)
-        if not concept:
-            return HTTPNotFound()
-        return concept
+        # Only tell the client its copy is valid once the concept is found
+        not_modified = self._conditional(provider)
+
+        def lookup():
+            with timed(self.request, 'get_by_id'):
+                concept = self._coalesced(
+                    ('concept', scheme_id, concept_id),
+                    lambda: provider.get_by_id(concept_id)
+                )
+            if not concept:
+                return HTTPNotFound()
+            return concept
+
+        return self._render_cached(
+            ('concept', scheme_id, concept_id), renderer, lookup, not_modified
+        )
+
+    def _conditional(self, provider):
+        '''
+        Make the response to this request a conditional response.
+
+        A strong `ETag` is calculated from the rendered response. If the
+        metadata of the provider contains a :class:`datetime.datetime` under
+        `last_modified`, it's sent as the `Last-Modified` header. Clients whose
+        copy is still valid receive a `304 Not Modified`.
+
+        :param provider: The provider that serves this request.
+        :returns: A :class:`pyramid.httpexceptions.HTTPNotModified` if the
+            client's copy is known to be valid without rendering the
+            response, `None` otherwise.
+        '''
+        last_modified = (provider.metadata or {}).get('last_modified')
+
+        def add_validators(request, response):
+            if response.status_code != 200:
+                return
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.md5_etag()
+            response.conditional_response = True
+
+        self.request.add_response_callback(add_validators)
+        if last_modified is not None and 'If-None-Match' not in self.request.headers:
+            since = parse_date(self.request.headers.get('If-Modified-Since'))
+            if since is not None and parse_date(serialize_date(last_modified)) <= since:
+                return HTTPNotModified(last_modified=last_modified)
+        return None
 
     @view_config(
         route_name='skosprovider.c.display_children',
@@ -374,11 +1003,21 @@ class ProviderView(RestView):
         provider = self.skos_registry.get_provider(scheme_id)
         if not provider:
             return HTTPNotFound()
-        language = self.request.params.get('language', self.request.locale_name)
-        children = provider.get_children_display(concept_id, language=language)
-        if children is False:
-            return HTTPNotFound()
-        return children
+        # Only tell the client its copy is valid once the concept is found
+        not_modified = self._conditional(provider)
+        language = get_render_context(self.request).language
+
+        def lookup():
+            with timed(self.request, 'get_children_display'):
+                children = provider.get_children_display(concept_id, language=language)
+            if children is False:
+                return HTTPNotFound()
+            return children
+
+        return self._render_cached(
+            ('display_children', scheme_id, concept_id), 'skosjson', lookup,
+            not_modified
+        )
 
     @view_config(
         route_name='skosprovider.c.expand',
@@ -392,7 +1031,107 @@ class ProviderView(RestView):
         provider = self.skos_registry.get_provider(scheme_id)
         if not provider:
             return HTTPNotFound()
-        expanded = provider.expand(concept_id)
+        with timed(self.request, 'expand'):
+            expanded = self._coalesced(
+                ('expand', scheme_id, concept_id),
+                lambda: provider.expand(concept_id)
+            )
         if not expanded:
             return HTTPNotFound()
         return expanded
+
+    @view_config(
+        route_name='skosprovider.conceptscheme.bulk',
+        request_method='GET',
+        accept='application/json',
+        renderer='skosjson'
+    )
+    def get_conceptscheme_bulk(self):
+        return self._get_conceptscheme_bulk()
+
+    @view_config(
+        route_name='skosprovider.conceptscheme.bulk',
+        request_method='GET',
+        accept='application/ld+json',
+        renderer='skosjsonld'
+    )
+    def get_conceptscheme_bulk_jsonld(self):
+        self.request.response.content_type = 'application/ld+json'
+        return self._get_conceptscheme_bulk()
+
+    def _get_conceptscheme_bulk(self):
+        scheme_id = self.request.matchdict['scheme_id']
+        provider = self.skos_registry.get_provider(scheme_id)
+        if not provider:
+            return HTTPNotFound()
+        ids = [id for id in self.request.params.get('ids', '').split(',') if id]
+        return self._get_bulk([(provider, id) for id in ids])
+
+    @view_config(
+        route_name='skosprovider.bulk',
+        request_method='POST',
+        accept='application/json',
+        renderer='skosjson',
+        require_csrf=False
+    )
+    def post_bulk(self):
+        return self._post_bulk()
+
+    @view_config(
+        route_name='skosprovider.bulk',
+        request_method='POST',
+        accept='application/ld+json',
+        renderer='skosjsonld',
+        require_csrf=False
+    )
+    def post_bulk_jsonld(self):
+        self.request.response.content_type = 'application/ld+json'
+        return self._post_bulk()
+
+    def _post_bulk(self):
+        try:
+            items = self.request.json_body
+        except ValueError:
+            return HTTPBadRequest()
+        if not isinstance(items, list) or not all(
+            isinstance(i, dict) and
+            _is_identifier(i.get('scheme_id')) and
+            _is_identifier(i.get('c_id'))
+            for i in items
+        ):
+            return HTTPBadRequest()
+        providers = {}
+        pairs = []
+        for i in items:
+            scheme_id = str(i['scheme_id'])
+            if scheme_id not in providers:
+                providers[scheme_id] = self.skos_registry.get_provider(scheme_id)
+            pairs.append((providers[scheme_id], i['c_id']))
+        return self._get_bulk(pairs)
+
+    def _get_bulk(self, pairs):
+        '''
+        Look up a number of concepts and collections with one lookup per
+        provider.
+
+        :param list pairs: Tuples of a provider and the id of a concept or
+            collection. The provider is `False` if it doesn't exist.
+        :returns: A :class:`list` of the concepts and collections that were
+            found, in the requested order.
+        '''
+        if len(pairs) > get_bulk_max_items(self.request.registry):
+            return HTTPBadRequest()
+        ids = {}
+        for p, id in pairs:
+            if p:
+                ids.setdefault(p.get_vocabulary_id(), (p, []))[1].append(id)
+        found = {
+            pid: _get_by_ids(p, provider_ids, self.request)
+            for pid, (p, provider_ids) in ids.items()
+        }
+        results = []
+        for p, id in pairs:
+            c = found[p.get_vocabulary_id()].get(str(id)) if p else None
+            if c:
+                results.append(c)
+        return results
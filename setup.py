@@ -47,6 +47,7 @@ setup(
     install_requires=requires,
     tests_require=tests_requires,
     extras_require={
-        'testing': testing_extras
+        'testing': testing_extras,
+        'orjson': ['orjson']
     },
 )
@@ -0,0 +1,182 @@
+# -*- coding: utf8 -*-
+
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from skosprovider.providers import DictionaryProvider
+from skosprovider.skos import ConceptScheme
+
+from pyramid_skosprovider.cache import (
+    ConceptSchemesCache,
+    LRUCache,
+    SingleFlight
+)
+
+
+class TestLRUCache:
+
+    def test_get_set(self):
+        cache = LRUCache(10, 60)
+        assert cache.get('a') is None
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 1}
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2, 60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert len(cache) == 2
+
+    def test_expires(self):
+        cache = LRUCache(10, 60)
+        with mock.patch('pyramid_skosprovider.cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with mock.patch('pyramid_skosprovider.cache.time.monotonic', return_value=161):
+            assert cache.get('a', 'missing') == 'missing'
+
+    def test_zero_entries_disables(self):
+        cache = LRUCache(0, 60)
+        cache.set('a', 1)
+        assert cache.get('a') is None
+
+    def test_invalidate_and_clear(self):
+        cache = LRUCache(10, 60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.invalidate('a')
+        assert cache.get('a') is None
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_get_stale(self):
+        cache = LRUCache(10, 60, 30)
+        with mock.patch('pyramid_skosprovider.cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with mock.patch('pyramid_skosprovider.cache.time.monotonic', return_value=170):
+            assert cache.get('a') is None
+            assert cache.get_stale('a') == (1, 70)
+        with mock.patch('pyramid_skosprovider.cache.time.monotonic', return_value=191):
+            assert cache.get_stale('a') is None
+        assert cache.get_stale('b') is None
+
+    def test_refresh_claimed_once(self):
+        cache = LRUCache(10, 60, 30)
+        assert cache.start_refresh('a')
+        assert not cache.start_refresh('a')
+        assert cache.start_refresh('b')
+        cache.end_refresh('a')
+        assert cache.start_refresh('a')
+
+
+class TestConceptSchemesCache:
+
+    def _get_provider(self, subject=None):
+        return DictionaryProvider(
+            {'id': 'TREES', 'subject': subject or []}, [],
+            concept_scheme=ConceptScheme(uri='http://python.com/trees')
+        )
+
+    def test_fingerprint(self):
+        p = self._get_provider()
+        fingerprint = ConceptSchemesCache.fingerprint([p])
+        assert ConceptSchemesCache.fingerprint([p]) == fingerprint
+        assert ConceptSchemesCache.fingerprint([p, self._get_provider()]) != fingerprint
+        p.concept_scheme = ConceptScheme(uri='http://python.com/trees')
+        assert ConceptSchemesCache.fingerprint([p]) != fingerprint
+
+    def test_fingerprint_not_shared(self):
+        fingerprint = ConceptSchemesCache.fingerprint([self._get_provider()], False)
+        assert ConceptSchemesCache.fingerprint([self._get_provider()], False) == fingerprint
+        assert ConceptSchemesCache.fingerprint(
+            [self._get_provider(['biology'])], False
+        ) != fingerprint
+
+    def test_labels(self):
+        cache = ConceptSchemesCache()
+        cache.remember_label('TREES', 'nl', 'Bomen')
+        cache.remember_label('BIRDS', 'nl', 'Vogels')
+        cache.set('key', [])
+        assert cache.last_label('TREES', 'nl') == 'Bomen'
+        assert cache.last_label('TREES', 'en', 'Trees') == 'Trees'
+        cache.forget_provider('TREES')
+        assert cache.get('key') is None
+        assert cache.last_label('TREES', 'nl') is None
+        assert cache.last_label('BIRDS', 'nl') == 'Vogels'
+
+
+class TestSingleFlight:
+
+    def _run_concurrently(self, flight, key, func, count):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do(key, func)))
+            for i in range(count)
+        ]
+        for t in threads:
+            t.start()
+        return threads, results
+
+    def test_do(self):
+        assert SingleFlight().do('a', lambda: 1) == 1
+
+    def test_concurrent_calls_shared(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def func():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        threads, results = self._run_concurrently(flight, 'a', func, 5)
+        while len(calls) < 1:
+            time.sleep(0.01)
+        # Give the other threads time to start waiting
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+        assert calls == [1]
+        assert results == ['result'] * 5
+        assert len(flight) == 0
+
+    def test_exception_shared(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        errors = []
+
+        def func():
+            release.wait(5)
+            raise ValueError()
+
+        def call():
+            try:
+                flight.do('a', func)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for i in range(3)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+        assert len(errors) == 3
+        with pytest.raises(KeyError):
+            flight.do('b', lambda: {}['missing'])
+        assert len(flight) == 0
+
+    def test_keys_not_shared(self):
+        flight = SingleFlight()
+        assert flight.do('a', lambda: flight.do('b', lambda: 2) + 1) == 3
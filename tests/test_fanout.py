@@ -0,0 +1,79 @@
+# -*- coding: utf8 -*-
+
+import threading
+import time
+
+from unittest.mock import Mock
+
+from pyramid_skosprovider.fanout import FanOut
+
+
+def _provider(id):
+    p = Mock()
+    p.get_vocabulary_id.return_value = id
+    return p
+
+
+class TestFanOut:
+
+    def setup_method(self):
+        self.fanout = FanOut(4, 0.5)
+
+    def teardown_method(self):
+        self.fanout.shutdown()
+
+    def test_results_in_order(self):
+        providers = [_provider(i) for i in range(5)]
+        results, failed = self.fanout.map(lambda p: p.get_vocabulary_id() * 2, providers)
+        assert [r for p, r in results] == [0, 2, 4, 6, 8]
+        assert [p for p, r in results] == providers
+        assert failed == []
+
+    def test_failing_provider_skipped(self):
+        def func(p):
+            if p.get_vocabulary_id() == 'B':
+                raise ValueError('Broken')
+            return p.get_vocabulary_id()
+        results, failed = self.fanout.map(func, [_provider('A'), _provider('B'), _provider('C')])
+        assert [r for p, r in results] == ['A', 'C']
+        assert failed == ['B']
+
+    def test_slow_provider_skipped(self):
+        release = threading.Event()
+
+        def func(p):
+            if p.get_vocabulary_id() == 'SLOW':
+                release.wait(5)
+            return p.get_vocabulary_id()
+        try:
+            results, failed = self.fanout.map(func, [_provider('SLOW'), _provider('FAST')])
+        finally:
+            release.set()
+        assert [r for p, r in results] == ['FAST']
+        assert failed == ['SLOW']
+
+    def test_slow_provider_holds_one_worker(self):
+        release = threading.Event()
+        called = []
+
+        def func(p):
+            called.append(p.get_vocabulary_id())
+            if p.get_vocabulary_id() == 'SLOW':
+                release.wait(5)
+            return p.get_vocabulary_id()
+        providers = [_provider('SLOW'), _provider('A'), _provider('B'), _provider('C')]
+        try:
+            for i in range(6):
+                results, failed = self.fanout.map(func, providers)
+                assert [r for p, r in results] == ['A', 'B', 'C']
+                assert failed == ['SLOW']
+        finally:
+            release.set()
+        assert called.count('SLOW') == 1
+        for i in range(50):
+            if not self.fanout._abandoned:
+                break
+            time.sleep(0.01)
+        results, failed = self.fanout.map(func, providers)
+        assert [r for p, r in results] == ['SLOW', 'A', 'B', 'C']
+        assert failed == []
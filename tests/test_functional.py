@@ -4,7 +4,10 @@ from pyramid.config import Configurator
 
 from webtest import TestApp
 
+import threading
 import unittest
+from unittest import mock
+import pytest
 import responses
 
 from .fixtures.data import (
@@ -467,3 +470,656 @@ class RestFunctionalTests(FunctionalTests):
             self.assertIn('uri', c)
             self.assertIn('label', c)
             self.assertEqual('concept', c['type'])
+
+
+class CacheFunctionalTests(unittest.TestCase):
+
+    def setUp(self):
+        settings = {
+            'skosprovider.skosregistry_location': 'registry',
+            'skosprovider.cache.enabled': 'true',
+            'skosprovider.cache.max_entries': '10',
+            'skosprovider.cache.ttl': '60'
+        }
+        self.app = skosmain({}, **settings)
+        self.testapp = TestApp(self.app)
+
+    def tearDown(self):
+        del self.testapp
+
+    def _get_cache(self):
+        from pyramid_skosprovider.cache import get_cache
+        return get_cache(self.app.registry, 'render')
+
+    def test_get_concept_cached(self):
+        uncached = TestApp(skosmain({})).get(
+            '/conceptschemes/TREES/c/1',
+            {'language': 'en'},
+            {'Accept': 'application/json'},
+            status=200
+        )
+        first = self.testapp.get(
+            '/conceptschemes/TREES/c/1',
+            {'language': 'en'},
+            {'Accept': 'application/json'},
+            status=200
+        )
+        second = self.testapp.get(
+            '/conceptschemes/TREES/c/1',
+            {'language': 'en'},
+            {'Accept': 'application/json'},
+            status=200
+        )
+        assert 'application/json' in second.headers['Content-Type']
+        assert first.body == uncached.body
+        assert second.body == first.body
+        stats = self._get_cache().stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['entries'] == 1
+
+    def test_get_concept_cached_per_language_and_renderer(self):
+        en = self.testapp.get(
+            '/conceptschemes/TREES/c/1',
+            {'language': 'en'},
+            {'Accept': 'application/json'},
+            status=200
+        )
+        nl = self.testapp.get(
+            '/conceptschemes/TREES/c/1',
+            {'language': 'nl'},
+            {'Accept': 'application/json'},
+            status=200
+        )
+        ld = self.testapp.get(
+            '/conceptschemes/TREES/c/1',
+            {'language': 'nl'},
+            {'Accept': 'application/ld+json'},
+            status=200
+        )
+        assert en.json['label'] == 'The Larch'
+        assert nl.json['label'] == 'De Lariks'
+        assert 'application/ld+json' in ld.headers['Content-Type']
+        assert '@context' in ld.json
+        assert self._get_cache().stats()['entries'] == 3
+
+    def test_get_unexisting_concept_not_cached(self):
+        self.testapp.get(
+            '/conceptschemes/TREES/c/987',
+            {},
+            {'Accept': 'application/json'},
+            status=404
+        )
+        assert self._get_cache().stats()['entries'] == 0
+
+
+class StaleCacheFunctionalTests(unittest.TestCase):
+
+    def setUp(self):
+        settings = {
+            'skosprovider.skosregistry_location': 'registry',
+            'skosprovider.cache.enabled': 'true',
+            'skosprovider.cache.ttl': '60',
+            'skosprovider.cache.max_stale': '600'
+        }
+        self.app = skosmain({}, **settings)
+        self.testapp = TestApp(self.app)
+
+    def _get(self, url, now):
+        with mock.patch('pyramid_skosprovider.cache.time.monotonic', return_value=now):
+            res = self.testapp.get(url, {}, {'Accept': 'application/json'}, status=200)
+            for t in threading.enumerate():
+                if t.name == 'skosprovider-refresh':
+                    t.join()
+        return res
+
+    def test_stale_served_and_refreshed(self):
+        for url in [
+            '/conceptschemes/TREES/c/1',
+            '/conceptschemes/TREES/topconcepts',
+            '/conceptschemes/TREES/displaytop',
+            '/conceptschemes/TREES/c/3/displaychildren'
+        ]:
+            fresh = self._get(url, 1000)
+            assert 'Warning' not in fresh.headers
+            stale = self._get(url, 1100)
+            assert stale.body == fresh.body
+            assert stale.headers['Warning'] == '110 - "Response is Stale"'
+            assert stale.headers['Age'] == '100'
+            refreshed = self._get(url, 1150)
+            assert refreshed.body == fresh.body
+            assert 'Warning' not in refreshed.headers
+
+    def test_provider_unavailable(self):
+        from skosprovider.exceptions import ProviderUnavailableException
+        url = '/conceptschemes/TREES/c/1'
+        fresh = self._get(url, 1000)
+        with mock.patch.object(
+            trees, 'get_by_id', side_effect=ProviderUnavailableException('down')
+        ):
+            stale = self._get(url, 1100)
+            assert stale.headers['Warning'] == '110 - "Response is Stale"'
+            stale = self._get(url, 1200)
+            assert stale.headers['Age'] == '200'
+        assert stale.body == fresh.body
+
+    def test_too_stale(self):
+        url = '/conceptschemes/TREES/c/1'
+        self._get(url, 1000)
+        res = self._get(url, 1700)
+        assert 'Warning' not in res.headers
+
+
+class BulkFunctionalTests(FunctionalTests):
+
+    def test_get_conceptscheme_bulk(self):
+        res = self.testapp.get(
+            '/conceptschemes/TREES/bulk',
+            {'ids': '3,1,987,2'},
+            {'Accept': 'application/json'},
+            status=200
+        )
+        assert [c['id'] for c in res.json] == [3, 1, 2]
+        single = self.testapp.get(
+            '/conceptschemes/TREES/c/1', {}, {'Accept': 'application/json'}, status=200
+        )
+        assert res.json[1] == single.json
+
+    def test_get_conceptscheme_bulk_jsonld(self):
+        res = self.testapp.get(
+            '/conceptschemes/TREES/bulk',
+            {'ids': '1,2'},
+            {'Accept': 'application/ld+json'},
+            status=200
+        )
+        assert res.content_type == 'application/ld+json'
+        single = self.testapp.get(
+            '/conceptschemes/TREES/c/2', {}, {'Accept': 'application/ld+json'}, status=200
+        )
+        assert res.json[1] == single.json
+
+    def test_get_conceptscheme_bulk_empty(self):
+        res = self.testapp.get(
+            '/conceptschemes/TREES/bulk', {}, {'Accept': 'application/json'}, status=200
+        )
+        assert res.json == []
+
+    def test_get_unexisting_conceptscheme_bulk(self):
+        self.testapp.get(
+            '/conceptschemes/FOO/bulk', {'ids': '1'}, {'Accept': 'application/json'}, status=404
+        )
+
+    def test_post_bulk(self):
+        res = self.testapp.post_json(
+            '/bulk',
+            [
+                {'scheme_id': 'TREES', 'c_id': 2},
+                {'scheme_id': 'FOO', 'c_id': 1},
+                {'scheme_id': 'TREES', 'c_id': '1'}
+            ],
+            headers={'Accept': 'application/json'},
+            status=200
+        )
+        assert [c['id'] for c in res.json] == [2, 1]
+
+    def test_post_bulk_jsonld(self):
+        res = self.testapp.post_json(
+            '/bulk',
+            [{'scheme_id': 'TREES', 'c_id': 3}],
+            headers={'Accept': 'application/ld+json'},
+            status=200
+        )
+        assert res.content_type == 'application/ld+json'
+        assert len(res.json) == 1
+
+    def test_post_bulk_invalid(self):
+        for body in [
+            b'nothing', b'{"scheme_id": "TREES"}', b'[{"c_id": 1}]',
+            b'[{"scheme_id": "TREES", "c_id": [1]}]',
+            b'[{"scheme_id": "TREES", "c_id": {"a": 1}}]',
+            b'[{"scheme_id": ["TREES"], "c_id": 1}]',
+            b'[{"scheme_id": "TREES", "c_id": null}]'
+        ]:
+            self.testapp.post(
+                '/bulk', body,
+                {'Accept': 'application/json', 'Content-Type': 'application/json'},
+                status=400
+            )
+
+    def test_too_many_items(self):
+        self.testapp.get(
+            '/conceptschemes/TREES/bulk',
+            {'ids': ','.join(['1'] * 201)},
+            {'Accept': 'application/json'},
+            status=400
+        )
+
+    def test_max_items_setting(self):
+        testapp = TestApp(skosmain({}, **{'skosprovider.bulk.max_items': '2'}))
+        testapp.get(
+            '/conceptschemes/TREES/bulk', {'ids': '1,2'},
+            {'Accept': 'application/json'}, status=200
+        )
+        testapp.get(
+            '/conceptschemes/TREES/bulk', {'ids': '1,2,3'},
+            {'Accept': 'application/json'}, status=400
+        )
+        assert testapp.app.registry.settings['skosprovider.bulk.max_items'] == '2'
+
+    def test_post_bulk_without_csrf_token(self):
+        config = Configurator(settings={})
+        config.set_default_csrf_options(require_csrf=True)
+        config.include('pyramid_skosprovider')
+        config.get_skos_registry().register_provider(trees)
+        testapp = TestApp(config.make_wsgi_app())
+        for accept in ['application/json', 'application/ld+json']:
+            res = testapp.post_json(
+                '/bulk', [{'scheme_id': 'TREES', 'c_id': 1}],
+                headers={'Accept': accept}, status=200
+            )
+            assert len(res.json) == 1
+
+
+class SingleFlightFunctionalTests(unittest.TestCase):
+
+    def setUp(self):
+        settings = {
+            'skosprovider.skosregistry_location': 'registry',
+            'skosprovider.single_flight.enabled': 'true'
+        }
+        self.testapp = TestApp(skosmain({}, **settings))
+        self.plainapp = TestApp(skosmain({}))
+
+    def test_same_responses(self):
+        for url, params in [
+            ('/c', {'label': 'De*', 'mode': 'dijitFilteringSelect', 'language': 'nl'}),
+            ('/conceptschemes/TREES/c', {'sort': 'label'}),
+            ('/conceptschemes/TREES/c/1', {}),
+            ('/conceptschemes/TREES/c/3/expand', {}),
+            ('/uris', {'uri': 'http://python.com/trees/larch'})
+        ]:
+            res = self.testapp.get(url, params, {'Accept': 'application/json'}, status=200)
+            plain = self.plainapp.get(url, params, {'Accept': 'application/json'}, status=200)
+            assert res.body == plain.body
+        self.testapp.get('/conceptschemes/TREES/c/55', {}, {'Accept': 'application/json'}, status=404)
+        self.testapp.get('/uris', {'uri': 'http://python.com/trees/oak'}, {'Accept': 'application/json'}, status=404)
+
+
+class IndexFunctionalTests(unittest.TestCase):
+
+    def setUp(self):
+        settings = {
+            'skosprovider.skosregistry_location': 'registry',
+            'skosprovider.index.enabled': 'true'
+        }
+        self.app = skosmain({}, **settings)
+        self.testapp = TestApp(self.app)
+
+    def tearDown(self):
+        del self.testapp
+
+    def test_indexes_built_at_startup(self):
+        from pyramid_skosprovider.indexes import get_indexes
+        indexes = get_indexes(self.app.registry)
+        assert 'TREES' in indexes._indexes
+
+    def test_get_uri_c_json(self):
+        res = self.testapp.get(
+            '/uris',
+            {'uri': 'http://python.com/trees/larch'},
+            {'Accept': 'application/json'},
+            status=200
+        )
+        assert res.json['id'] == 1
+        assert res.json['type'] == 'concept'
+        assert res.json['uri'] == 'http://python.com/trees/larch'
+        assert res.json['concept_scheme'] == {
+            'id': 'TREES',
+            'type': 'skos:ConceptScheme',
+            'uri': 'http://python.com/trees'
+        }
+
+    def test_get_uri_unexisting(self):
+        self.testapp.get(
+            '/uris',
+            {'uri': 'http://python.com/trees/oak'},
+            {'Accept': 'application/json'},
+            status=404
+        )
+
+    def _assert_same_as_without_indexes(self, url, params, headers=None):
+        plain = TestApp(skosmain({}))
+        headers = dict(headers or {}, Accept='application/json')
+        res = self.testapp.get(url, params, headers, status=200)
+        expected = plain.get(url, params, headers, status=200)
+        assert res.json == expected.json
+        assert res.headers['Content-Range'] == expected.headers['Content-Range']
+        return res
+
+    def test_get_concepts_startswith(self):
+        res = self._assert_same_as_without_indexes(
+            '/c',
+            {'mode': 'dijitFilteringSelect', 'label': 'De*', 'language': 'nl'}
+        )
+        assert [c['id'] for c in res.json] == [1, 2]
+
+    def test_get_conceptscheme_concepts_startswith(self):
+        res = self._assert_same_as_without_indexes(
+            '/conceptschemes/TREES/c',
+            {'mode': 'dijitFilteringSelect', 'label': 'the*', 'language': 'en', 'sort': '-label'}
+        )
+        assert [c['id'] for c in res.json] == [1, 2]
+
+    def test_get_concepts_endswith(self):
+        res = self._assert_same_as_without_indexes(
+            '/c',
+            {'mode': 'dijitFilteringSelect', 'label': '*kastanje', 'language': 'nl'}
+        )
+        assert [c['id'] for c in res.json] == [2]
+
+    def test_get_conceptscheme_concepts_endswith(self):
+        res = self._assert_same_as_without_indexes(
+            '/conceptschemes/TREES/c',
+            {'mode': 'dijitFilteringSelect', 'label': '*CH', 'language': 'en'}
+        )
+        assert [c['id'] for c in res.json] == [1]
+
+    def test_get_conceptscheme_concepts_collection(self):
+        res = self._assert_same_as_without_indexes(
+            '/conceptschemes/TREES/c',
+            {'collection': 3, 'sort': 'id'}
+        )
+        assert [c['id'] for c in res.json] == [1, 2]
+
+    def test_get_concepts_matches(self):
+        res = self._assert_same_as_without_indexes(
+            '/c',
+            {'match': 'http://id.python.org/different/types/of/trees/nr/1/the/larch', 'match_type': 'close'}
+        )
+        assert [c['id'] for c in res.json] == [1]
+
+    def test_get_conceptscheme_concepts_matches(self):
+        res = self._assert_same_as_without_indexes(
+            '/conceptschemes/TREES/c',
+            {'match': 'http://id.python.org/different/types/of/trees/nr/17/the/other/chestnut'}
+        )
+        assert [c['id'] for c in res.json] == [2]
+
+    def test_get_conceptscheme_concepts_range(self):
+        res = self._assert_same_as_without_indexes(
+            '/conceptschemes/TREES/c',
+            {'sort': '-label', 'language': 'nl'},
+            {'Range': 'items=1-1'}
+        )
+        assert len(res.json) == 1
+        assert res.headers['Content-Range'] == 'items 1-1/3'
+
+
+class ConditionalFunctionalTests(FunctionalTests):
+
+    def _assert_conditional(self, url, headers=None):
+        headers = dict(headers or {'Accept': 'application/json'})
+        res = self.testapp.get(url, {}, headers, status=200)
+        etag = res.headers['ETag']
+        assert etag
+        headers['If-None-Match'] = etag
+        res = self.testapp.get(url, {}, headers, status=304)
+        assert res.body == b''
+        headers['If-None-Match'] = '"other"'
+        self.testapp.get(url, {}, headers, status=200)
+
+    def test_get_concept(self):
+        self._assert_conditional('/conceptschemes/TREES/c/1')
+
+    def test_get_concept_jsonld(self):
+        self._assert_conditional(
+            '/conceptschemes/TREES/c/1',
+            {'Accept': 'application/ld+json'}
+        )
+
+    def test_get_conceptscheme(self):
+        self._assert_conditional('/conceptschemes/TREES')
+
+    def test_get_conceptscheme_jsonld(self):
+        self._assert_conditional('/conceptschemes/TREES.jsonld')
+
+    def test_get_top_concepts(self):
+        self._assert_conditional('/conceptschemes/TREES/topconcepts')
+
+    def test_get_display_top(self):
+        self._assert_conditional('/conceptschemes/TREES/displaytop')
+
+    def test_get_display_children(self):
+        self._assert_conditional('/conceptschemes/TREES/c/3/displaychildren')
+
+    def test_etag_depends_on_language(self):
+        nl = self.testapp.get('/conceptschemes/TREES/c/1', {'language': 'nl'},
+                              {'Accept': 'application/json'}, status=200)
+        en = self.testapp.get('/conceptschemes/TREES/c/1', {'language': 'en'},
+                              {'Accept': 'application/json'}, status=200)
+        assert nl.headers['ETag'] != en.headers['ETag']
+
+    def test_not_found_has_no_etag(self):
+        res = self.testapp.get('/conceptschemes/TREES/c/987', {},
+                               {'Accept': 'application/json'}, status=404)
+        assert 'ETag' not in res.headers
+
+
+class LastModifiedFunctionalTests(unittest.TestCase):
+
+    def setUp(self):
+        from datetime import datetime, timezone
+        from skosprovider.providers import DictionaryProvider
+        from skosprovider.skos import ConceptScheme
+        from .fixtures.data import larch
+        self.provider = DictionaryProvider(
+            {
+                'id': 'LARCHES',
+                'last_modified': datetime(2023, 10, 21, 12, 0, 0, tzinfo=timezone.utc)
+            },
+            [larch],
+            concept_scheme=ConceptScheme(uri='http://python.com/larches')
+        )
+        config = Configurator(settings={})
+        config.include('pyramid_skosprovider')
+        config.get_skos_registry().register_provider(self.provider)
+        self.testapp = TestApp(config.make_wsgi_app())
+
+    def test_last_modified(self):
+        res = self.testapp.get('/conceptschemes/LARCHES/c/1', {},
+                               {'Accept': 'application/json'}, status=200)
+        assert res.headers['Last-Modified'] == 'Sat, 21 Oct 2023 12:00:00 GMT'
+
+    def _get_if_modified_since(self, url, status, testapp=None):
+        return (testapp or self.testapp).get(
+            url, {},
+            {
+                'Accept': 'application/json',
+                'If-Modified-Since': 'Sat, 21 Oct 2023 12:00:00 GMT'
+            },
+            status=status
+        )
+
+    def test_if_modified_since(self):
+        res = self._get_if_modified_since('/conceptschemes/LARCHES/c/1', 304)
+        assert res.headers['Last-Modified'] == 'Sat, 21 Oct 2023 12:00:00 GMT'
+
+    def test_if_modified_since_unexisting(self):
+        self._get_if_modified_since('/conceptschemes/LARCHES/c/99999', 404)
+        self._get_if_modified_since('/conceptschemes/LARCHES/c/99999/displaychildren', 404)
+
+    def test_if_modified_since_cached_skips_lookup(self):
+        from unittest import mock
+        config = Configurator(settings={'skosprovider.cache.enabled': 'true'})
+        config.include('pyramid_skosprovider')
+        config.get_skos_registry().register_provider(self.provider)
+        testapp = TestApp(config.make_wsgi_app())
+        testapp.get('/conceptschemes/LARCHES/c/1', {},
+                    {'Accept': 'application/json'}, status=200)
+        with mock.patch.object(self.provider, 'get_by_id') as get_by_id:
+            self._get_if_modified_since('/conceptschemes/LARCHES/c/1', 304, testapp)
+            assert not get_by_id.called
+
+    def test_if_modified_since_older(self):
+        self.testapp.get(
+            '/conceptschemes/LARCHES/c/1', {},
+            {
+                'Accept': 'application/json',
+                'If-Modified-Since': 'Fri, 20 Oct 2023 12:00:00 GMT'
+            },
+            status=200
+        )
+
+
+class StreamingFunctionalTests(unittest.TestCase):
+
+    def setUp(self):
+        settings = {
+            'skosprovider.skosregistry_location': 'registry',
+            'skosprovider.streaming.enabled': 'true',
+            'skosprovider.streaming.chunk_size': '2'
+        }
+        self.testapp = TestApp(skosmain({}, **settings))
+        self.plainapp = TestApp(skosmain({}))
+
+    def _assert_identical(self, url, params=None, headers=None):
+        headers = headers or {'Accept': 'application/json'}
+        streamed = self.testapp.get(url, params or {}, headers, status=200)
+        plain = self.plainapp.get(url, params or {}, headers, status=200)
+        assert streamed.body == plain.body
+        assert streamed.headers['Content-Type'] == plain.headers['Content-Type']
+        assert streamed.headers['Content-Range'] == plain.headers['Content-Range']
+        return streamed
+
+    def test_get_concepts(self):
+        res = self._assert_identical('/c')
+        assert len(res.json) == 3
+
+    def test_get_conceptscheme_concepts(self):
+        res = self._assert_identical('/conceptschemes/TREES/c', {'sort': '-label'})
+        assert len(res.json) == 3
+
+    def test_get_conceptscheme_concepts_empty(self):
+        res = self._assert_identical('/conceptschemes/TREES/c', {'label': 'oak'})
+        assert res.json == []
+
+    def test_range_not_streamed(self):
+        self._assert_identical(
+            '/conceptschemes/TREES/c', {},
+            {'Accept': 'application/json', 'Range': 'items=1-2'}
+        )
+
+
+class JSONBackendFunctionalTests(unittest.TestCase):
+
+    def setUp(self):
+        pytest.importorskip('orjson')
+        settings = {
+            'skosprovider.skosregistry_location': 'registry',
+            'skosprovider.json.backend': 'orjson'
+        }
+        self.testapp = TestApp(skosmain({}, **settings))
+        self.plainapp = TestApp(skosmain({}))
+
+    def _assert_same_json(self, url, params=None, headers=None):
+        headers = headers or {'Accept': 'application/json'}
+        res = self.testapp.get(url, params or {}, headers, status=200)
+        plain = self.plainapp.get(url, params or {}, headers, status=200)
+        assert res.json == plain.json
+        assert res.headers['Content-Type'] == plain.headers['Content-Type']
+        return res
+
+    def test_get_concept(self):
+        self._assert_same_json('/conceptschemes/TREES/c/1', {'language': 'nl'})
+
+    def test_get_collection(self):
+        self._assert_same_json('/conceptschemes/TREES/c/3')
+
+    def test_get_concept_jsonld(self):
+        self._assert_same_json(
+            '/conceptschemes/TREES/c/1', {}, {'Accept': 'application/ld+json'}
+        )
+
+    def test_get_conceptschemes(self):
+        self._assert_same_json('/conceptschemes')
+
+    def test_get_concepts(self):
+        self._assert_same_json('/c', {'sort': 'label'})
+
+
+class TimingFunctionalTests(FunctionalTests):
+
+    def setUp(self):
+        settings = {
+            'skosprovider.skosregistry_location': 'registry',
+            'skosprovider.timing.enabled': 'true'
+        }
+        self.testapp = TestApp(skosmain({}, **settings))
+
+    def test_get_concept(self):
+        res = self.testapp.get(
+            '/conceptschemes/TREES/c/3',
+            {},
+            {'Accept': 'application/json'},
+            status=200
+        )
+        metrics = [m.split(';')[0] for m in res.headers['Server-Timing'].split(', ')]
+        assert metrics == ['get_by_id', 'render']
+
+    def test_get_concept_jsonld(self):
+        res = self.testapp.get(
+            '/conceptschemes/TREES/c/1.jsonld',
+            {},
+            {'Accept': 'application/ld+json'},
+            status=200
+        )
+        assert 'jsonld;desc="1 call"' in res.headers['Server-Timing']
+
+    def test_get_conceptscheme_concepts(self):
+        res = self.testapp.get(
+            '/conceptschemes/TREES/c',
+            {},
+            {'Accept': 'application/json'},
+            status=200
+        )
+        assert res.headers['Server-Timing'].startswith('find;desc="1 call";dur=')
+
+    def test_disabled_by_default(self):
+        testapp = TestApp(skosmain({}, **{
+            'skosprovider.skosregistry_location': 'registry'
+        }))
+        res = testapp.get(
+            '/conceptschemes/TREES/c/1',
+            {},
+            {'Accept': 'application/json'},
+            status=200
+        )
+        assert 'Server-Timing' not in res.headers
+
+
+class MetricsFunctionalTests(unittest.TestCase):
+
+    def setUp(self):
+        settings = {
+            'skosprovider.skosregistry_location': 'registry',
+            'skosprovider.metrics.enabled': 'true',
+            'skosprovider.cache.enabled': 'true'
+        }
+        self.testapp = TestApp(skosmain({}, **settings))
+
+    def test_metrics(self):
+        self.testapp.get('/conceptschemes/TREES/c/1', {}, {'Accept': 'application/json'}, status=200)
+        self.testapp.get('/conceptschemes/TREES/c/1', {}, {'Accept': 'application/json'}, status=200)
+        self.testapp.get('/conceptschemes/TREES/c/55', {}, {'Accept': 'application/json'}, status=404)
+        self.testapp.get('/conceptschemes/UNKNOWN/c', {}, {'Accept': 'application/json'}, status=404)
+        res = self.testapp.get('/metrics', status=200)
+        assert res.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+        assert 'skosprovider_requests_total{route="skosprovider.c",provider="TREES",status="200"} 2\n' in res.text
+        assert 'skosprovider_errors_total{route="skosprovider.c",provider="TREES",error="not_found"} 1\n' in res.text
+        assert 'skosprovider_errors_total{route="skosprovider.conceptscheme.cs",provider="",error="not_found"} 1\n' in res.text
+        assert 'skosprovider_cache_hit_ratio{cache="render"} 0.3333333333333333\n' in res.text
+        assert 'route="skosprovider.metrics"' not in res.text
+
+    def test_metrics_disabled(self):
+        testapp = TestApp(skosmain({}))
+        testapp.get('/metrics', status=404)
@@ -0,0 +1,349 @@
+# -*- coding: utf8 -*-
+
+import pytest
+
+from skosprovider.providers import (
+    DictionaryProvider,
+    VocabularyProvider
+)
+from skosprovider.registry import Registry
+from skosprovider.skos import (
+    Concept,
+    ConceptScheme
+)
+
+from pyramid_skosprovider.indexes import (
+    LabelIndex,
+    ProviderIndex,
+    SkosIndexes
+)
+from pyramid_skosprovider.views import ProviderView
+
+from .fixtures.data import (
+    larch,
+    chestnut,
+    species,
+    trees
+)
+
+
+class RemoteProvider(VocabularyProvider):
+    '''
+    A provider that can't be indexed.
+    '''
+
+    def __init__(self):
+        super().__init__(
+            {'id': 'REMOTE'},
+            concept_scheme=ConceptScheme(uri='http://python.com/remote')
+        )
+        self.lookups = []
+
+    def get_by_uri(self, uri):
+        self.lookups.append(uri)
+        if uri == 'http://python.com/remote/1':
+            return Concept(id=1, uri=uri)
+        return False
+
+
+def _get_trees():
+    return DictionaryProvider(
+        {'id': 'TREES'},
+        [larch, chestnut, species],
+        concept_scheme=ConceptScheme(uri='http://python.com/trees')
+    )
+
+
+def _get_forest():
+    words = ['oak', 'Oakwood', 'larch', 'Beech', 'birch', 'Ørsted', 'straße']
+    return DictionaryProvider(
+        {'id': 'FOREST', 'default_language': 'en'},
+        [
+            {
+                'id': i,
+                'type': 'collection' if i == 1 else 'concept',
+                'members': [2, 3, 4] if i == 1 else [],
+                'member_of': [1] if i in (2, 3, 4) else [],
+                'labels': [
+                    {'type': 'prefLabel', 'language': 'en', 'label': '%s %d' % (words[i % len(words)], i)},
+                    {'type': 'prefLabel', 'language': 'nl', 'label': 'nl %s' % words[(i * 3) % len(words)]},
+                    {'type': 'sortLabel', 'language': 'en', 'label': str(100 - i)}
+                ],
+                'matches': {
+                    'close': ['http://external.org/%d' % (i % 3)],
+                    'exact': ['http://external.org/exact/%d' % (i % 2)]
+                } if i != 1 else {}
+            } for i in range(1, 31)
+        ],
+        concept_scheme=ConceptScheme(uri='http://python.com/forest')
+    )
+
+
+class _QueryBuilder(object):
+
+    def __init__(self, label):
+        self.label = label
+        self.postprocess = label is not None
+
+
+def _assert_same_results(indexes, provider, query, label=None, **kwargs):
+    if label is not None:
+        query = dict(query, label=label.replace('*', ''))
+    expected = provider.find(dict(query), **kwargs)
+    found = indexes.find(
+        provider, dict(query),
+        **ProviderView._label_hints(_QueryBuilder(label)), **kwargs
+    )
+    if label is not None:
+        expected = ProviderView._postprocess_wildcards(expected, label)
+        found = ProviderView._postprocess_wildcards(found, label)
+    assert found == expected
+    return found
+
+
+class TestLabelIndex:
+
+    def test_startswith(self):
+        index = LabelIndex(_get_forest(), 'en')
+        assert sorted(index.startswith('OAK')) == [0, 6, 7, 13, 14, 20, 21, 27, 28]
+        assert index.startswith('nothing') == []
+
+    def test_startswith_casefolded(self):
+        index = LabelIndex(_get_forest(), 'en')
+        assert index.startswith('STRASSE') == index.startswith('straße')
+        assert len(index.startswith('straße')) == 4
+
+    def test_endswith(self):
+        index = LabelIndex(_get_forest(), 'en')
+        assert sorted(index.endswith('1')) == [0, 10, 20]
+        assert sorted(index.endswith('K 14')) == [13]
+        assert index.endswith('nothing') == []
+
+    def test_endswith_casefolded(self):
+        index = LabelIndex(_get_forest(), 'nl')
+        assert index.endswith('STRASSE') == index.endswith('straße')
+        assert len(index.endswith('straße')) == 5
+
+    def test_language(self):
+        index = LabelIndex(_get_forest(), 'nl')
+        assert len(index.startswith('nl oak')) == 8
+
+
+class TestProviderIndex:
+
+    def test_uris(self):
+        index = ProviderIndex(trees)
+        assert index.uris['http://python.com/trees/larch'] == (1, 'concept')
+        assert index.uris['http://python.com/trees/species'] == (3, 'collection')
+
+    def test_get_members(self):
+        provider = _get_forest()
+        provider.list[1].narrower = [5]
+        index = ProviderIndex(provider)
+        collection = provider.get_by_id(1)
+        assert index.get_members(provider, collection) == {'2', '3', '4'}
+        assert index.get_members(provider, collection, 'all') == {'2', '3', '4', '5'}
+        assert index.get_members(provider, collection, 'all') is \
+            index.get_members(provider, collection, 'all')
+
+    def test_get_matches(self):
+        index = ProviderIndex(_get_forest())
+        assert index.get_matches('http://external.org/1', 'close') == {3, 6, 9, 12, 15, 18, 21, 24, 27}
+        assert index.get_matches('http://external.org/exact/1', 'close') == \
+            index.get_matches('http://external.org/exact/1', 'exact')
+        assert index.get_matches('http://external.org/exact/1', 'broad') == set()
+        assert len(index.get_matches('http://external.org/exact/0')) == 15
+        assert index.get_matches('http://unknown.org') == set()
+
+    def test_get_ranks(self):
+        provider = _get_forest()
+        index = ProviderIndex(provider)
+        ranks = index.get_ranks(provider, 'sortlabel', 'en')
+        assert len(ranks) == 30
+        assert ranks[29] == 1
+        assert ranks[0] == 30
+        assert index.get_ranks(provider, 'sortlabel', 'en') is ranks
+
+    def test_get_ranks_shared(self):
+        provider = _get_forest()
+        index = ProviderIndex(provider)
+        ranks = index.get_ranks(provider, 'label', 'nl')
+        assert max(ranks) == 7
+        assert ranks[0] == ranks[7]
+        assert index.get_ranks(provider, 'unknown', 'nl') is ranks
+
+    def test_is_current(self):
+        provider = _get_trees()
+        index = ProviderIndex(provider)
+        assert index.is_current(provider)
+        provider.list.append(provider._from_dict({'id': 4}))
+        assert not index.is_current(provider)
+        provider.list = []
+        assert not index.is_current(provider)
+
+
+class TestSkosIndexes:
+
+    def setup_method(self):
+        self.indexes = SkosIndexes()
+        self.remote = RemoteProvider()
+        self.regis = Registry()
+        self.regis.register_provider(_get_trees())
+        self.regis.register_provider(self.remote)
+
+    def test_get_not_indexable(self):
+        assert self.indexes.get(self.remote) is None
+
+    def test_get_rebuilds_outdated_index(self):
+        provider = self.regis.get_provider('TREES')
+        index = self.indexes.get(provider)
+        assert self.indexes.get(provider) is index
+        provider.list = provider.list[0:1]
+        assert self.indexes.get(provider) is not index
+
+    def test_resolve_uri_indexed(self):
+        p, id, type = self.indexes.resolve_uri(self.regis, 'http://python.com/trees/larch')
+        assert p.get_vocabulary_id() == 'TREES'
+        assert id == 1
+        assert type == 'concept'
+        assert self.remote.lookups == []
+
+    def test_resolve_uri_not_indexed_remembered(self):
+        for i in range(2):
+            p, id, type = self.indexes.resolve_uri(self.regis, 'http://python.com/remote/1')
+            assert p is self.remote
+            assert id == 1
+        assert self.remote.lookups == ['http://python.com/remote/1']
+
+    def test_resolve_uri_miss_remembered(self):
+        for i in range(2):
+            assert self.indexes.resolve_uri(self.regis, 'http://python.com/nothing') is None
+        assert self.remote.lookups == ['http://python.com/nothing']
+
+    def test_resolve_uri_miss_forgotten_when_providers_change(self):
+        assert self.indexes.resolve_uri(self.regis, 'http://python.com/birds/1') is None
+        birds = DictionaryProvider(
+            {'id': 'BIRDS'},
+            [{'id': 1, 'uri': 'http://python.com/birds/1'}],
+            concept_scheme=ConceptScheme(uri='http://python.com/birds')
+        )
+        self.regis.register_provider(birds)
+        p, id, type = self.indexes.resolve_uri(self.regis, 'http://python.com/birds/1')
+        assert p is birds
+
+    def test_find_not_indexable(self):
+        assert self.indexes.find(self.remote, {}) is None
+
+    def test_find_custom_find_not_indexed(self):
+        class CustomProvider(DictionaryProvider):
+            def find(self, query, **kwargs):
+                return []
+
+        provider = CustomProvider({'id': 'CUSTOM'}, [{'id': 1}])
+        assert self.indexes.find(provider, {}) is None
+
+    def test_find_startswith(self):
+        forest = _get_forest()
+        found = _assert_same_results(self.indexes, forest, {}, 'oak*', language='en')
+        assert [c['label'] for c in found] == [
+            'Oakwood 1', 'oak 7', 'Oakwood 8', 'oak 14', 'Oakwood 15', 'oak 21',
+            'Oakwood 22', 'oak 28', 'Oakwood 29'
+        ]
+
+    def test_find_same_results(self):
+        forest = _get_forest()
+        for label in [
+            None, 'oak*', 'OAKWOOD*', 'b*', 'straße*', 'nl*', 'x*', 'o*k*',
+            '*1', '*OAK', '*straße', '* 2', '*x', '*o*k'
+        ]:
+            for language in ['en', 'nl', 'nl-BE', 'fr']:
+                for query in [{}, {'type': 'concept'}, {'type': 'collection'}]:
+                    for sort in [{}, {'sort': 'label', 'sort_order': 'desc'}, {'sort': 'sortlabel'}]:
+                        _assert_same_results(
+                            self.indexes, forest, query, label, language=language, **sort
+                        )
+
+    def test_find_sorted(self):
+        forest = _get_forest()
+        for sort in ['id', 'uri', 'label', 'sortlabel', 'unknown']:
+            for sort_order in ['asc', 'desc']:
+                for language in ['en', 'nl', 'nl-BE', 'fr']:
+                    _assert_same_results(
+                        self.indexes, forest, {'type': 'concept'}, 'o*',
+                        language=language, sort=sort, sort_order=sort_order
+                    )
+        found = self.indexes.find(forest, {}, language='en', sort='sortlabel')
+        assert [c['id'] for c in found] == list(range(30, 0, -1))
+
+    def test_find_page(self):
+        forest = _get_forest()
+        for sort in [{}, {'sort': 'label'}, {'sort': 'sortlabel', 'sort_order': 'desc'}]:
+            for language in ['en', 'nl', 'nl-BE']:
+                for query in [{}, {'type': 'concept'}, {'label': 'nl'}, {'label': 'x'}]:
+                    expected = forest.find(dict(query), language=language, **sort)
+                    for offset, limit in [(0, 2), (3, 2), (0, 25), (28, 5), (40, 2)]:
+                        page = self.indexes.find_page(
+                            forest, dict(query), offset, limit, language=language, **sort
+                        )
+                        assert page == (expected[offset:offset + limit], len(expected))
+
+    def test_find_page_not_indexable(self):
+        assert self.indexes.find_page(self.remote, {}, 0, 10) is None
+
+    def test_find_page_unknown_collection(self):
+        with pytest.raises(ValueError):
+            self.indexes.find_page(_get_forest(), {'collection': {'id': 99}}, 0, 10)
+
+    def test_find_collection(self):
+        forest = _get_forest()
+        forest.list[1].narrower = [5]
+        for collection in [{'id': 1}, {'id': '1', 'depth': 'all'}]:
+            for label in [None, 'oak*', '*3', 'nl']:
+                for query in [{}, {'type': 'concept'}]:
+                    _assert_same_results(
+                        self.indexes, forest, dict(query, collection=collection),
+                        label, language='en', sort='label'
+                    )
+        found = self.indexes.find(forest, {'collection': {'id': 1, 'depth': 'all'}})
+        assert [c['id'] for c in found] == [2, 3, 4, 5]
+
+    def test_find_matches(self):
+        forest = _get_forest()
+        for uri in ['http://external.org/1', 'http://external.org/exact/0', 'http://unknown.org']:
+            for type in [None, '', 'close', 'exact', 'broad', 'unknown']:
+                for query in [{}, {'type': 'concept'}, {'type': 'collection'}]:
+                    matches = {'uri': uri}
+                    if type is not None:
+                        matches['type'] = type
+                    _assert_same_results(
+                        self.indexes, forest, dict(query, matches=matches),
+                        None, language='en'
+                    )
+        found = self.indexes.find(forest, {'matches': {'uri': 'http://external.org/2', 'type': 'close'}})
+        assert [c['id'] for c in found] == [2, 5, 8, 11, 14, 17, 20, 23, 26, 29]
+
+    def test_find_matches_without_uri(self):
+        with pytest.raises(ValueError):
+            self.indexes.find(_get_forest(), {'matches': {'type': 'close'}})
+
+    def test_find_unknown_collection(self):
+        forest = _get_forest()
+        with pytest.raises(ValueError):
+            self.indexes.find(forest, {'label': 'nl', 'collection': {'id': 99}}, startswith='x')
+
+    def test_find_endswith(self):
+        forest = _get_forest()
+        found = _assert_same_results(self.indexes, forest, {}, '*ch 17', language='en')
+        assert [c['label'] for c in found] == ['Beech 17']
+
+    def test_find_trees(self):
+        provider = self.regis.get_provider('TREES')
+        for label in ['The*', 'de*', 'bomen*', 'Trees by*', '*larch', '*soort', '*s']:
+            for language in ['en', 'nl']:
+                _assert_same_results(self.indexes, provider, {}, label, language=language)
+
+    def test_invalidate(self):
+        provider = self.regis.get_provider('TREES')
+        index = self.indexes.get(provider)
+        self.indexes.invalidate('TREES')
+        assert self.indexes.get(provider) is not index
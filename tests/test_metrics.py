@@ -0,0 +1,100 @@
+# -*- coding: utf8 -*-
+
+import subprocess
+import sys
+from unittest import mock
+
+from pyramid import testing
+
+from pyramid_skosprovider.cache import (
+    ISkosCache,
+    LRUCache
+)
+from pyramid_skosprovider.metrics import Metrics
+
+
+class TestMetrics:
+
+    def test_observe(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.observe('skosprovider.c', 'TREES', 200, 0.05)
+        metrics.observe('skosprovider.c', 'TREES', 200, 0.5)
+        metrics.observe('skosprovider.c', 'TREES', 404, 2.0, 'not_found')
+        text = metrics.render()
+        assert 'skosprovider_requests_total{route="skosprovider.c",provider="TREES",status="200"} 2\n' in text
+        assert 'skosprovider_requests_total{route="skosprovider.c",provider="TREES",status="404"} 1\n' in text
+        assert 'skosprovider_errors_total{route="skosprovider.c",provider="TREES",error="not_found"} 1\n' in text
+        assert 'skosprovider_request_duration_seconds_bucket{route="skosprovider.c",provider="TREES",le="0.1"} 1\n' in text
+        assert 'skosprovider_request_duration_seconds_bucket{route="skosprovider.c",provider="TREES",le="1.0"} 2\n' in text
+        assert 'skosprovider_request_duration_seconds_bucket{route="skosprovider.c",provider="TREES",le="+Inf"} 3\n' in text
+        assert 'skosprovider_request_duration_seconds_sum{route="skosprovider.c",provider="TREES"} 2.55\n' in text
+        assert 'skosprovider_request_duration_seconds_count{route="skosprovider.c",provider="TREES"} 3\n' in text
+        assert '# TYPE skosprovider_request_duration_seconds histogram\n' in text
+
+    def test_count_error(self):
+        metrics = Metrics()
+        metrics.count_error('skosprovider.conceptschemes', 'TREES', 'ProviderUnavailableException')
+        assert 'skosprovider_errors_total{route="skosprovider.conceptschemes",provider="TREES",error="ProviderUnavailableException"} 1\n' in metrics.render()
+
+    def test_escapes_labels(self):
+        metrics = Metrics()
+        metrics.count_error('skosprovider.c', 'A "quoted"\\id', 'not_found')
+        assert 'provider="A \\"quoted\\"\\\\id"' in metrics.render()
+
+    def test_caches(self):
+        config = testing.setUp()
+        cache = LRUCache()
+        config.registry.registerUtility(cache, ISkosCache, name='render')
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        text = Metrics().render(config.registry)
+        testing.tearDown()
+        assert 'skosprovider_cache_hits_total{cache="render"} 2\n' in text
+        assert 'skosprovider_cache_misses_total{cache="render"} 1\n' in text
+        assert 'skosprovider_cache_entries{cache="render"} 1\n' in text
+        assert 'skosprovider_cache_hit_ratio{cache="render"} 0.6666666666666666\n' in text
+
+    def test_multiprocess(self, tmpdir):
+        worker1 = Metrics(multiprocess_dir=str(tmpdir))
+        worker2 = Metrics(multiprocess_dir=str(tmpdir))
+        worker1.observe('skosprovider.c', 'TREES', 200, 0.05)
+        worker2.observe('skosprovider.c', 'TREES', 200, 0.05)
+        worker2.observe('skosprovider.c', 'TREES', 200, 0.05)
+        with mock.patch('pyramid_skosprovider.metrics.os.getpid', return_value=1):
+            worker1.flush()
+        with mock.patch('pyramid_skosprovider.metrics.os.getpid', return_value=2):
+            text = worker2.render()
+        assert 'skosprovider_requests_total{route="skosprovider.c",provider="TREES",status="200"} 3\n' in text
+        assert 'skosprovider_request_duration_seconds_count{route="skosprovider.c",provider="TREES"} 3\n' in text
+
+    def test_multiprocess_exited_worker(self, tmpdir):
+        config = testing.setUp()
+        cache = LRUCache()
+        config.registry.registerUtility(cache, ISkosCache, name='render')
+        cache.set('a', 1)
+        cache.get('a')
+        worker = Metrics(multiprocess_dir=str(tmpdir))
+        worker.observe('skosprovider.c', 'TREES', 200, 0.05)
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        with mock.patch('pyramid_skosprovider.metrics.os.getpid', return_value=exited.pid):
+            worker.flush(config.registry)
+        cache.get('b')
+        text = Metrics(multiprocess_dir=str(tmpdir)).render(config.registry)
+        testing.tearDown()
+        assert 'skosprovider_requests_total{route="skosprovider.c",provider="TREES",status="200"} 1\n' in text
+        assert 'skosprovider_cache_hits_total{cache="render"} 2\n' in text
+        assert 'skosprovider_cache_misses_total{cache="render"} 1\n' in text
+        assert 'skosprovider_cache_entries{cache="render"} 1\n' in text
+        assert 'skosprovider_cache_hit_ratio{cache="render"} 0.5\n' in text
+
+    def test_maybe_flush(self, tmpdir):
+        metrics = Metrics(multiprocess_dir=str(tmpdir), flush_interval=60)
+        metrics.observe('skosprovider.c', 'TREES', 200, 0.05)
+        metrics.maybe_flush()
+        assert tmpdir.listdir() == []
+        metrics.flush_interval = 0
+        metrics.maybe_flush()
+        assert len(tmpdir.listdir()) == 1
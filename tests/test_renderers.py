@@ -18,6 +18,8 @@ from skosprovider.skos import (
 
 import json
 
+import pytest
+
 import unittest
 from unittest.mock import Mock
 
@@ -221,3 +223,150 @@ class TestRenderers(unittest.TestCase):
         p.configure_mock(**config)
         rels = _map_relations([5], p)
         assert len(rels) == 0
+
+    def test_map_relations_string_ids(self):
+        from pyramid_skosprovider.renderers import _map_relations
+        rels = _map_relations(['1', '2'], trees, 'en')
+        assert [r['id'] for r in rels] == [1, 2]
+
+    def test_get_by_ids_fallback_dedupes(self):
+        from pyramid_skosprovider.renderers import _get_by_ids
+        p = Mock()
+        p.get_by_id.side_effect = lambda id: trees.get_by_id(id)
+        found = _get_by_ids(p, [1, 2, 1, 5])
+        assert set(found.keys()) == {'1', '2'}
+        assert p.get_by_id.call_count == 3
+
+    def test_concept_adapter_uses_get_by_ids(self):
+        from pyramid_skosprovider.renderers import concept_adapter
+
+        class BulkProvider(object):
+            calls = []
+
+            def get_by_ids(self, ids):
+                self.calls.append(ids)
+                return [trees.get_by_id(id) for id in ids]
+
+        p = BulkProvider()
+        c = Concept(
+            id=4,
+            labels=larch['labels'],
+            concept_scheme=trees.concept_scheme,
+            narrower=[1, 2],
+            related=[2],
+            member_of=[3]
+        )
+        request = testing.DummyRequest()
+        m = Mock()
+        m.get_provider.return_value = p
+        request.skos_registry = m
+        request.locale_name = 'en'
+        concept = concept_adapter(c, request)
+        assert p.calls == [[1, 2, 3]]
+        assert [r['id'] for r in concept['narrower']] == [1, 2]
+        assert [r['id'] for r in concept['related']] == [2]
+        assert [r['id'] for r in concept['member_of']] == [3]
+        assert concept['broader'] == []
+
+
+class TestRenderContext:
+
+    def _get_request(self):
+        request = testing.DummyRequest()
+        request.skos_registry = Mock()
+        request.skos_registry.get_provider.return_value = trees
+        request.locale_name = 'nl'
+        return request
+
+    def test_reused_for_request(self):
+        from pyramid_skosprovider.renderers import get_render_context
+        request = self._get_request()
+        assert get_render_context(request) is get_render_context(request)
+        assert get_render_context(request) is not get_render_context(self._get_request())
+
+    def test_language(self):
+        from pyramid_skosprovider.renderers import get_render_context
+        request = self._get_request()
+        assert get_render_context(request).language == 'nl'
+        request = self._get_request()
+        request.params['language'] = 'en'
+        assert get_render_context(request).language == 'en'
+
+    def test_provider_looked_up_once(self):
+        from pyramid_skosprovider.renderers import concept_adapter
+        request = self._get_request()
+        for c in [larch, chestnut]:
+            concept = concept_adapter(trees.get_by_id(c['id']), request)
+            assert concept['id'] == c['id']
+        request.skos_registry.get_provider.assert_called_once_with(
+            trees.concept_scheme.uri
+        )
+
+
+class TestSerializers:
+
+    def test_get_serializer(self):
+        from pyramid_skosprovider.renderers import get_serializer
+        assert get_serializer() is json.dumps
+        assert get_serializer('json') is json.dumps
+        with pytest.raises(ValueError):
+            get_serializer('unknown')
+
+    def test_orjson(self):
+        pytest.importorskip('orjson')
+        from pyramid_skosprovider.renderers import (
+            get_serializer,
+            orjson_dumps
+        )
+        assert get_serializer('orjson') is orjson_dumps
+        assert get_serializer('auto') is orjson_dumps
+        value = {'label': 'Lariks é', 'ids': [1, 2], 3: None}
+        assert json.loads(orjson_dumps(value)) == json.loads(json.dumps(value))
+
+    def test_with_serializer(self):
+        from pyramid_skosprovider.renderers import (
+            json_renderer,
+            with_serializer
+        )
+        assert with_serializer(json_renderer, json.dumps) is json_renderer
+        renderer = with_serializer(json_renderer, lambda obj, **kw: '')
+        assert renderer is not json_renderer
+        assert renderer.components is json_renderer.components
+
+
+class TestJSONStream:
+
+    def _encode(self, results, chunk_size):
+        from pyramid_skosprovider.renderers import JSONStream
+        request = testing.DummyRequest()
+        stream = JSONStream(chunk_size=chunk_size)
+        return b''.join(stream.app_iter(iter(results), request))
+
+    def test_identical_to_json(self):
+        results = [
+            {'id': i, 'uri': 'http://python.com/%d' % i, 'label': 'Lariks é %d' % i}
+            for i in range(7)
+        ]
+        for chunk_size in [1, 3, 7, 10]:
+            assert self._encode(results, chunk_size) == json.dumps(results).encode('utf-8')
+
+    def test_empty(self):
+        assert self._encode([], 3) == b'[]'
+
+    def test_identical_to_orjson(self):
+        pytest.importorskip('orjson')
+        from pyramid.renderers import JSON
+        from pyramid_skosprovider.renderers import (
+            JSONStream,
+            orjson_dumps
+        )
+        results = [{'id': i, 'label': 'Lariks é %d' % i} for i in range(7)]
+        stream = JSONStream(JSON(serializer=orjson_dumps), chunk_size=3)
+        body = b''.join(stream.app_iter(iter(results), testing.DummyRequest()))
+        assert body == orjson_dumps(results).encode('utf-8')
+
+    def test_uses_adapters(self):
+        s = Source('<em>My citation</em>', 'HTML')
+        assert json.loads(self._encode([s], 3)) == [
+            {'citation': '<em>My citation</em>', 'markup': 'HTML'}
+        ]
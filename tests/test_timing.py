@@ -0,0 +1,81 @@
+# -*- coding: utf8 -*-
+
+from unittest import mock
+
+from pyramid import testing
+from pyramid.response import Response
+
+from pyramid_skosprovider.timing import (
+    Timings,
+    get_timings,
+    timed,
+    timed_renderer
+)
+
+
+class TestTimings:
+
+    def test_counts_calls(self):
+        timings = Timings()
+        timings.add('find', 0.002)
+        timings.add('find', 0.001)
+        timings.add('get_by_id', 0.0005)
+        count, total = timings.entries['find']
+        assert count == 2
+        assert round(total, 6) == 0.003
+        assert timings.header() == \
+            'find;desc="2 calls";dur=3.000, get_by_id;desc="1 call";dur=0.500'
+
+    def test_timed(self):
+        timings = Timings()
+        with mock.patch(
+            'pyramid_skosprovider.timing.time.perf_counter',
+            side_effect=[10.0, 10.25]
+        ):
+            with timings.timed('expand'):
+                pass
+        assert timings.entries['expand'] == (1, 0.25)
+
+    def test_timed_records_failures(self):
+        timings = Timings()
+        try:
+            with timings.timed('find'):
+                raise ValueError()
+        except ValueError:
+            pass
+        assert timings.entries['find'][0] == 1
+
+
+class TestRequestTimings:
+
+    def test_timed_without_timings(self):
+        request = testing.DummyRequest()
+        with timed(request, 'find'):
+            pass
+        with timed(None, 'find'):
+            pass
+
+    def test_header(self):
+        request = testing.DummyRequest()
+        request.skos_timings = get_timings(request)
+        with timed(request, 'find'):
+            pass
+        response = Response()
+        response.headers['Server-Timing'] = 'app;dur=1'
+        request._process_response_callbacks(response)
+        assert response.headers['Server-Timing'].startswith('app;dur=1, find;desc="1 call";dur=')
+
+    def test_no_header_without_timings(self):
+        request = testing.DummyRequest()
+        request.skos_timings = get_timings(request)
+        response = Response()
+        request._process_response_callbacks(response)
+        assert 'Server-Timing' not in response.headers
+
+    def test_timed_renderer(self):
+        request = testing.DummyRequest()
+        request.skos_timings = get_timings(request)
+        factory = timed_renderer(lambda info: lambda value, system: 'rendered')
+        render = factory(None)
+        assert render({}, {'request': request}) == 'rendered'
+        assert request.skos_timings.entries['render'][0] == 1
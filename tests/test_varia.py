@@ -15,6 +15,7 @@ from skosprovider.registry import (
 )
 
 import unittest
+from unittest import mock
 import pytest
 
 
@@ -134,3 +135,119 @@ class TestIncludeMe(unittest.TestCase):
         }
         self.config = testing.setUp(settings=settings);
         includeme(self.config)
+
+    def test_includeme_request_resolves_factory_once(self):
+        from pyramid_skosprovider import ISkosRegistryFactory
+        settings = {
+            'skosprovider.skosregistry_location': 'request',
+            'skosprovider.skosregistry_factory': 'tests.test_varia._skosregis_factory_request'
+        }
+        self.config = testing.setUp(settings=settings)
+        includeme(self.config)
+        factory = self.config.registry.queryUtility(ISkosRegistryFactory)
+        assert factory is _skosregis_factory_request
+        request = testing.DummyRequest()
+        request.registry = self.config.registry
+        with mock.patch('pyramid_skosprovider.DottedNameResolver') as resolver:
+            SR = _register_request_skos_registry(request)
+            assert not resolver.called
+        assert isinstance(SR, Registry)
+
+
+def _skosregis_reset(skos_registry, request):
+    skos_registry.metadata = {'request': request}
+
+
+class TestRegistryPool(unittest.TestCase):
+
+    def setUp(self):
+        settings = {
+            'skosprovider.skosregistry_location': 'request',
+            'skosprovider.skosregistry_factory': 'tests.test_varia._skosregis_factory_request',
+            'skosprovider.skosregistry_pool': 'true',
+            'skosprovider.skosregistry_pool_size': '1',
+            'skosprovider.skosregistry_reset': 'tests.test_varia._skosregis_reset'
+        }
+        self.config = testing.setUp(settings=settings)
+        includeme(self.config)
+
+    def tearDown(self):
+        testing.tearDown()
+        del self.config
+
+    def _get_request(self):
+        request = testing.DummyRequest()
+        request.registry = self.config.registry
+        return request
+
+    def test_registry_reused(self):
+        r1 = self._get_request()
+        SR1 = _register_request_skos_registry(r1)
+        r1._process_finished_callbacks()
+        r2 = self._get_request()
+        SR2 = _register_request_skos_registry(r2)
+        assert SR1 is SR2
+        assert SR2.metadata['request'] is r2
+
+    def test_registry_in_use_not_shared(self):
+        SR1 = _register_request_skos_registry(self._get_request())
+        SR2 = _register_request_skos_registry(self._get_request())
+        assert SR1 is not SR2
+
+    def test_pool_size(self):
+        r1 = self._get_request()
+        r2 = self._get_request()
+        SR1 = _register_request_skos_registry(r1)
+        SR2 = _register_request_skos_registry(r2)
+        r1._process_finished_callbacks()
+        r2._process_finished_callbacks()
+        SR3 = _register_request_skos_registry(self._get_request())
+        SR4 = _register_request_skos_registry(self._get_request())
+        assert SR3 is SR1
+        assert SR4 is not SR2
+
+    def test_failed_request_discards_registry(self):
+        r1 = self._get_request()
+        SR1 = _register_request_skos_registry(r1)
+        r1.exception = ValueError()
+        r1._process_finished_callbacks()
+        SR2 = _register_request_skos_registry(self._get_request())
+        assert SR1 is not SR2
+
+
+class TestParseSettings(object):
+
+    def test_defaults(self):
+        from pyramid_skosprovider import _parse_settings
+        args = _parse_settings({})
+        assert args['skosregistry_location'] == 'registry'
+        assert args['cache.enabled'] is False
+        assert args['timing.enabled'] is False
+        assert args['metrics.enabled'] is False
+        assert args['metrics.path'] == '/metrics'
+        assert args['json.backend'] == 'json'
+
+    def test_cache_settings(self):
+        from pyramid_skosprovider import _parse_settings
+        args = _parse_settings({
+            'skosprovider.cache.enabled': 'true',
+            'skosprovider.cache.max_entries': '50',
+            'skosprovider.cache.ttl': '10'
+        })
+        assert args['cache.enabled'] is True
+        assert args['cache.max_entries'] == 50
+        assert args['cache.ttl'] == 10
+
+    def test_bulk_settings(self):
+        from pyramid_skosprovider import _parse_settings
+        assert _parse_settings({})['bulk.max_items'] == 200
+        args = _parse_settings({'skosprovider.bulk.max_items': '10'})
+        assert args['bulk.max_items'] == 10
+
+    def test_invalid_bulk_setting_fails_at_config_time(self):
+        config = testing.setUp(settings={'skosprovider.bulk.max_items': 'many'})
+        try:
+            with pytest.raises(ValueError):
+                config.include('pyramid_skosprovider')
+        finally:
+            testing.tearDown()
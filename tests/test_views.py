@@ -1,6 +1,9 @@
 # -*- coding: utf8 -*-
 
+import json
 import logging
+import threading
+import time
 from unittest import mock
 from unittest.mock import Mock
 from unittest.mock import PropertyMock
@@ -25,6 +28,7 @@ from skosprovider.skos import (
     Label
 )
 
+from skosprovider.providers import DictionaryProvider
 from skosprovider.registry import Registry
 
 class StaticViewTests(unittest.TestCase):
@@ -57,13 +61,21 @@ class StaticViewTests(unittest.TestCase):
         assert 'skos' in ctxt['@context']
 
 
-class ProviderViewTests(unittest.TestCase):
+class ProviderViewTestCase(unittest.TestCase):
+    '''
+    Sets up pyramid_skosprovider and a registry for testing the
+    :class:`pyramid_skosprovider.views.ProviderView`.
+
+    Subclasses can override the settings and the registered providers.
+    '''
+
+    settings = {}
+    instance_scope = 'single'
 
     def setUp(self):
-        self.config = testing.setUp()
+        self.config = testing.setUp(settings=dict(self.settings))
         self.config.include('pyramid_skosprovider')
-        self.regis = Registry()
-        self.regis.register_provider(trees)
+        self.regis = self._get_registry(self.instance_scope)
 
     def tearDown(self):
         testing.tearDown()
@@ -80,6 +92,18 @@ class ProviderViewTests(unittest.TestCase):
         from pyramid_skosprovider.views import ProviderView
         return ProviderView(request)
 
+    def _get_providers(self):
+        return [trees]
+
+    def _get_registry(self, instance_scope='single'):
+        regis = Registry(instance_scope=instance_scope)
+        for p in self._get_providers():
+            regis.register_provider(p)
+        return regis
+
+
+class ProviderViewTests(ProviderViewTestCase):
+
     def test_get_unexisting_uri(self):
         request = self._get_dummy_request()
         request.matchdict = {'uri': 'urn:x-skosprovider:rain'}
@@ -163,6 +187,26 @@ class ProviderViewTests(unittest.TestCase):
             assert 'uri' in cs
             assert 'label' in cs
 
+    def test_contexts_not_shared_between_views(self):
+        from skosprovider.jsonld import MINI_CONTEXT
+        mini_context = json.dumps(MINI_CONTEXT, sort_keys=True)
+        request = self._get_dummy_request()
+        request.matchdict = {'uri': 'http://python.com/trees'}
+        scheme = self._get_provider_view(request).get_uri()
+        request = self._get_dummy_request()
+        request.matchdict = {'uri': 'http://python.com/trees/larch'}
+        concept = self._get_provider_view(request).get_uri()
+        conceptschemes = self._get_provider_view(self._get_dummy_request()).get_conceptschemes()
+        assert scheme['@context']['concept_scheme'] == 'skos:ConceptScheme'
+        assert concept['@context']['concept_scheme'] == {
+            '@id': 'skos:inScheme',
+            '@type': '@id'
+        }
+        assert 'subject' not in concept['@context']
+        assert 'concept_scheme' not in conceptschemes[0]['@context']
+        assert 'subject' in conceptschemes[0]['@context']
+        assert json.dumps(MINI_CONTEXT, sort_keys=True) == mini_context
+
     def test_get_conceptschemes_provider_unavailable(self):
         request = self._get_dummy_request()
         pv = self._get_provider_view(request)
@@ -193,6 +237,55 @@ class ProviderViewTests(unittest.TestCase):
             for cs in conceptschemes:
                 assert cs["label"] == "https://vocabulary-uri"
 
+    def _register_conceptschemes_cache(self):
+        from pyramid_skosprovider.cache import (
+            ConceptSchemesCache,
+            ISkosCache
+        )
+        cache = ConceptSchemesCache()
+        self.config.registry.registerUtility(cache, ISkosCache, name='conceptschemes')
+        return cache
+
+    def test_get_conceptschemes_cached(self):
+        self._register_conceptschemes_cache()
+        request = self._get_dummy_request()
+        conceptschemes = self._get_provider_view(request).get_conceptschemes()
+        with mock.patch(
+            "skosprovider.skos.ConceptScheme.label",
+            new=Mock(side_effect=ProviderUnavailableException("test")),
+        ) as label:
+            request = self._get_dummy_request()
+            assert self._get_provider_view(request).get_conceptschemes() is conceptschemes
+            request = self._get_dummy_request(params={'language': 'nl'})
+            self._get_provider_view(request).get_conceptschemes()
+            assert label.call_count == 1
+
+    def test_get_conceptschemes_cache_provider_added(self):
+        self._register_conceptschemes_cache()
+        request = self._get_dummy_request()
+        assert len(self._get_provider_view(request).get_conceptschemes()) == 1
+        self.regis.register_provider(DictionaryProvider(
+            {'id': 'BIRDS'}, [], concept_scheme=ConceptScheme(uri='http://python.com/birds')
+        ))
+        request = self._get_dummy_request()
+        assert len(self._get_provider_view(request).get_conceptschemes()) == 2
+
+    def test_get_conceptschemes_cache_keeps_last_label(self):
+        cache = self._register_conceptschemes_cache()
+        request = self._get_dummy_request(params={'language': 'nl'})
+        label = self._get_provider_view(request).get_conceptschemes()[0]['label']
+        cache.clear()
+        with mock.patch(
+            "skosprovider.skos.ConceptScheme.label",
+            new=Mock(side_effect=ProviderUnavailableException("test")),
+        ):
+            request = self._get_dummy_request(params={'language': 'nl'})
+            conceptschemes = self._get_provider_view(request).get_conceptschemes()
+        assert conceptschemes[0]['label'] == label
+        cache.forget_provider('TREES')
+        assert len(cache) == 0
+        assert cache.last_label('TREES', 'nl') is None
+
     def test_get_conceptschemes_jsonld(self):
         request = self._get_dummy_request()
         request.accept = 'application/ld+json'
@@ -897,3 +990,429 @@ class ProviderViewTests(unittest.TestCase):
         concepts = pv.get_conceptscheme_concepts()
         self.assertIsInstance(concepts, list)
         self.assertEqual(0, len(concepts))
+
+
+class QueryCacheViewTests(ProviderViewTestCase):
+
+    settings = {
+        'skosprovider.query_cache.enabled': 'true'
+    }
+
+    def test_get_concepts_pages_share_find(self):
+        with mock.patch.object(trees, 'find', wraps=trees.find) as find:
+            for r in ['items=0-0', 'items=1-1', 'items=2-2']:
+                request = self._get_dummy_request({'sort': 'id'})
+                request.headers['Range'] = r
+                concepts = self._get_provider_view(request).get_concepts()
+                assert len(concepts) == 1
+                assert request.response.headers['Content-Range'].endswith('/3')
+            assert find.call_count == 1
+
+    def test_get_concepts_cached_results_not_modified(self):
+        request = self._get_dummy_request()
+        concepts = self._get_provider_view(request).get_concepts()
+        assert '@context' in concepts[0]
+        request = self._get_dummy_request()
+        request.headers['Range'] = 'items=1-2'
+        concepts = self._get_provider_view(request).get_concepts()
+        assert '@context' in concepts[0]
+        assert '@context' not in concepts[1]
+
+    def test_get_conceptscheme_concepts_key_includes_query(self):
+        with mock.patch.object(trees, 'find', wraps=trees.find) as find:
+            for label in ['Larc', 'Larc', 'Chest']:
+                request = self._get_dummy_request({'label': label})
+                request.matchdict = {'scheme_id': 'TREES'}
+                concepts = self._get_provider_view(request).get_conceptscheme_concepts()
+                assert len(concepts) == 1
+            assert find.call_count == 2
+
+    def test_get_conceptscheme_concepts_wildcards_cached(self):
+        labels = []
+        for label in ['*larch', 'larch*']:
+            request = self._get_dummy_request({
+                'mode': 'dijitFilteringSelect',
+                'label': label,
+                'language': 'en'
+            })
+            request.matchdict = {'scheme_id': 'TREES'}
+            concepts = self._get_provider_view(request).get_conceptscheme_concepts()
+            labels.append([c['label'] for c in concepts])
+        assert labels == [['The Larch'], []]
+
+    def test_request_registry_not_cached(self):
+        from .fixtures.data import larch, chestnut
+        found = []
+        for concepts in [[larch], [chestnut]]:
+            self.regis = Registry(instance_scope='threaded_thread')
+            self.regis.register_provider(
+                DictionaryProvider({'id': 'TREES'}, concepts)
+            )
+            request = self._get_dummy_request()
+            request.matchdict = {'scheme_id': 'TREES'}
+            concepts = self._get_provider_view(request).get_conceptscheme_concepts()
+            found.append([c['id'] for c in concepts])
+        assert found == [[1], [2]]
+
+
+class PagingProvider(DictionaryProvider):
+    '''
+    A provider that implements the paging contract used by the views.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pages = []
+
+    def find_page(self, query, offset, limit, **kwargs):
+        self.pages.append((offset, limit))
+        concepts = self.find(query, **kwargs)
+        return concepts[offset:offset + limit], len(concepts)
+
+
+def _paging_provider(id, uri, concepts):
+    return PagingProvider(
+        {'id': id},
+        concepts,
+        concept_scheme=ConceptScheme(uri=uri)
+    )
+
+
+class PagingViewTests(ProviderViewTestCase):
+
+    def setUp(self):
+        self.birds = _paging_provider(
+            'BIRDS', 'http://python.com/birds',
+            [
+                {'id': i, 'labels': [{'type': 'prefLabel', 'language': 'en', 'label': 'Bird %d' % i}]}
+                for i in range(1, 11)
+            ]
+        )
+        super().setUp()
+
+    def _get_providers(self):
+        return [trees, self.birds]
+
+    def test_get_conceptscheme_concepts_range_passed_to_provider(self):
+        request = self._get_dummy_request()
+        request.matchdict = {'scheme_id': 'BIRDS'}
+        request.headers['Range'] = 'items=2-4'
+        concepts = self._get_provider_view(request).get_conceptscheme_concepts()
+        assert [c['id'] for c in concepts] == [3, 4, 5]
+        assert self.birds.pages == [(2, 3)]
+        assert request.response.headers['Content-Range'] == 'items 2-4/10'
+        assert '@context' in concepts[0]
+
+    def test_get_conceptscheme_concepts_no_range_not_paged(self):
+        request = self._get_dummy_request()
+        request.matchdict = {'scheme_id': 'BIRDS'}
+        concepts = self._get_provider_view(request).get_conceptscheme_concepts()
+        assert len(concepts) == 10
+        assert self.birds.pages == []
+
+    def test_get_concepts_range_spans_providers(self):
+        request = self._get_dummy_request()
+        request.headers['Range'] = 'items=1-4'
+        concepts = self._get_provider_view(request).get_concepts()
+        assert [c['id'] for c in concepts] == [2, 3, 1, 2]
+        assert self.birds.pages == [(0, 2)]
+        assert request.response.headers['Content-Range'] == 'items 1-4/13'
+
+    def test_get_concepts_range_after_first_provider(self):
+        request = self._get_dummy_request()
+        request.headers['Range'] = 'items=5-6'
+        concepts = self._get_provider_view(request).get_concepts()
+        assert [c['id'] for c in concepts] == [3, 4]
+        assert self.birds.pages == [(2, 2)]
+
+    def test_get_concepts_full_page_still_counts(self):
+        request = self._get_dummy_request({'providers.ids': 'BIRDS,TREES'})
+        request.headers['Range'] = 'items=0-1'
+        concepts = self._get_provider_view(request).get_concepts()
+        assert [c['id'] for c in concepts] == [1, 2]
+        assert request.response.headers['Content-Range'] == 'items 0-1/13'
+
+
+class SlowProvider(DictionaryProvider):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = threading.Event()
+
+    def find(self, query, **kwargs):
+        self.release.wait(5)
+        return super().find(query, **kwargs)
+
+
+class FanOutViewTests(ProviderViewTestCase):
+
+    settings = {
+        'skosprovider.fanout.enabled': 'true',
+        'skosprovider.fanout.workers': '2',
+        'skosprovider.fanout.timeout': '0.5'
+    }
+
+    def setUp(self):
+        self.slow = SlowProvider(
+            {'id': 'SLOW'},
+            [{'id': 1, 'labels': [{'type': 'prefLabel', 'language': 'en', 'label': 'Slow'}]}],
+            concept_scheme=ConceptScheme(uri='http://python.com/slow')
+        )
+        super().setUp()
+
+    def tearDown(self):
+        self.slow.release.set()
+        from pyramid_skosprovider.fanout import get_fanout
+        get_fanout(self.config.registry).shutdown()
+        super().tearDown()
+
+    def _get_providers(self):
+        return [trees, self.slow]
+
+    def test_get_concepts_all_providers_answer(self):
+        self.slow.release.set()
+        request = self._get_dummy_request()
+        concepts = self._get_provider_view(request).get_concepts()
+        assert [c['label'] for c in concepts][-1] == 'Slow'
+        assert len(concepts) == 4
+        assert 'X-Skosprovider-Skipped' not in request.response.headers
+
+    def test_get_concepts_slow_provider_skipped(self):
+        request = self._get_dummy_request()
+        concepts = self._get_provider_view(request).get_concepts()
+        assert len(concepts) == 3
+        assert request.response.headers['X-Skosprovider-Skipped'] == 'SLOW'
+
+    def test_get_concepts_range_slow_provider_skipped(self):
+        request = self._get_dummy_request()
+        request.headers['Range'] = 'items=1-5'
+        concepts = self._get_provider_view(request).get_concepts()
+        assert [c['id'] for c in concepts] == [2, 3]
+        assert request.response.headers['Content-Range'] == 'items 1-5/3'
+        assert request.response.headers['X-Skosprovider-Skipped'] == 'SLOW'
+
+    def test_get_concepts_range_all_providers_answer(self):
+        self.slow.release.set()
+        request = self._get_dummy_request()
+        request.headers['Range'] = 'items=2-3'
+        concepts = self._get_provider_view(request).get_concepts()
+        assert [c['label'] for c in concepts] == ['Trees by species', 'Slow']
+        assert request.response.headers['Content-Range'] == 'items 2-3/4'
+
+
+class StreamingViewTests(ProviderViewTestCase):
+
+    settings = {
+        'skosprovider.streaming.enabled': 'true',
+        'skosprovider.streaming.chunk_size': '4'
+    }
+
+    def setUp(self):
+        self.birds = _paging_provider(
+            'BIRDS', 'http://python.com/birds',
+            [
+                {'id': i, 'labels': [{'type': 'prefLabel', 'language': 'en', 'label': 'Bird %d' % i}]}
+                for i in range(1, 11)
+            ]
+        )
+        super().setUp()
+
+    def _get_providers(self):
+        return [self.birds]
+
+    def _get_dummy_request(self, *args, **kwargs):
+        request = super()._get_dummy_request(*args, **kwargs)
+        request.matchdict = {'scheme_id': 'BIRDS'}
+        return request
+
+    def test_pages_fetched_while_streaming(self):
+        self.regis = self._get_registry('threaded_global')
+        request = self._get_dummy_request()
+        response = self._get_provider_view(request).get_conceptscheme_concepts()
+        assert response.headers['Content-Range'] == 'items 0-9/10'
+        assert self.birds.pages == [(0, 4)]
+        data = json.loads(b''.join(response.app_iter))
+        assert [c['id'] for c in data] == list(range(1, 11))
+        assert '@context' in data[0]
+        assert self.birds.pages == [(0, 4), (4, 4), (8, 4)]
+
+    def test_request_registry_fetched_before_streaming(self):
+        self.regis = self._get_registry('threaded_thread')
+        request = self._get_dummy_request()
+        response = self._get_provider_view(request).get_conceptscheme_concepts()
+        assert self.birds.pages == []
+        data = json.loads(b''.join(response.app_iter))
+        assert len(data) == 10
+
+
+class StaleCacheViewTests(ProviderViewTestCase):
+
+    settings = {
+        'skosprovider.cache.enabled': 'true',
+        'skosprovider.cache.ttl': '60',
+        'skosprovider.cache.max_stale': '600'
+    }
+    instance_scope = 'threaded_thread'
+
+    def _get_concept(self, now):
+        request = self._get_dummy_request()
+        request.matchdict = {'scheme_id': 'TREES', 'c_id': '1'}
+        with mock.patch('pyramid_skosprovider.cache.time.monotonic', return_value=now):
+            return self._get_provider_view(request).get_concept()
+
+    def test_request_registry_refreshed_first(self):
+        fresh = self._get_concept(1000).text
+        with mock.patch.object(trees, 'get_by_id', wraps=trees.get_by_id) as get_by_id:
+            response = self._get_concept(1100)
+            assert get_by_id.call_count == 1
+        assert response.text == fresh
+        assert 'Warning' not in response.headers
+
+    def test_request_registry_provider_unavailable(self):
+        fresh = self._get_concept(1000).text
+        with mock.patch.object(
+            trees, 'get_by_id', side_effect=ProviderUnavailableException('down')
+        ):
+            response = self._get_concept(1100)
+            assert response.text == fresh
+            assert response.headers['Warning'] == '111 - "Revalidation Failed"'
+            assert response.headers['Age'] == '100'
+            with pytest.raises(ProviderUnavailableException):
+                self._get_concept(1700)
+
+
+class SingleFlightViewTests(ProviderViewTestCase):
+
+    settings = {
+        'skosprovider.single_flight.enabled': 'true'
+    }
+
+    def _get_dummy_request(self, *args, **kwargs):
+        request = super()._get_dummy_request(*args, **kwargs)
+        # The current registry is local to a thread
+        request.registry = self.config.registry
+        return request
+
+    def _get_concept(self):
+        request = self._get_dummy_request()
+        request.matchdict = {'scheme_id': 'TREES', 'c_id': '1'}
+        return self._get_provider_view(request).get_concept()
+
+    def _count_lookups(self):
+        release = threading.Event()
+        calls = []
+        original = trees.get_by_id
+
+        def get_by_id(id):
+            calls.append(id)
+            release.wait(5)
+            return original(id)
+
+        results = []
+        with mock.patch.object(trees, 'get_by_id', side_effect=get_by_id):
+            threads = [
+                threading.Thread(target=lambda: results.append(self._get_concept()))
+                for i in range(4)
+            ]
+            for t in threads:
+                t.start()
+            time.sleep(0.1)
+            release.set()
+            for t in threads:
+                t.join()
+        assert [c.id for c in results] == [1] * 4
+        return len(calls)
+
+    def test_get_concept_coalesced(self):
+        self.regis = self._get_registry('threaded_global')
+        assert self._count_lookups() == 1
+
+    def test_request_registry_not_coalesced(self):
+        self.regis = self._get_registry('threaded_thread')
+        assert self._count_lookups() == 4
+
+    def _get_page(self):
+        request = self._get_dummy_request(params={'label': 'la'})
+        request.headers['Range'] = 'items=0-9'
+        request.matchdict = {'scheme_id': 'TREES'}
+        concepts = self._get_provider_view(request).get_conceptscheme_concepts()
+        return concepts, request.response.headers['Content-Range']
+
+    def test_paged_search_coalesced(self):
+        self.regis = self._get_registry('threaded_global')
+        release = threading.Event()
+        calls = []
+        original = trees.find
+
+        def find(query, **kwargs):
+            calls.append(query)
+            release.wait(5)
+            return original(query, **kwargs)
+
+        results = []
+        with mock.patch.object(trees, 'find', side_effect=find):
+            threads = [
+                threading.Thread(target=lambda: results.append(self._get_page()))
+                for i in range(4)
+            ]
+            for t in threads:
+                t.start()
+            time.sleep(0.1)
+            release.set()
+            for t in threads:
+                t.join()
+        assert len(calls) == 1
+        assert len(results) == 4
+        for concepts, content_range in results:
+            assert [c['id'] for c in concepts] == [1]
+            assert '@context' in concepts[0]
+            assert content_range == 'items 0-9/1'
+
+
+class IndexViewTests(ProviderViewTestCase):
+
+    settings = {
+        'skosprovider.index.enabled': 'true'
+    }
+
+    def _get_uri(self):
+        request = self._get_dummy_request()
+        request.params['uri'] = 'http://python.com/trees/larch'
+        return self._get_provider_view(request).get_uri()
+
+    def test_global_registry_indexed(self):
+        from pyramid_skosprovider.indexes import get_indexes
+        self.regis = self._get_registry('threaded_global')
+        assert self._get_uri()['id'] == 1
+        assert 'TREES' in get_indexes(self.config.registry)._indexes
+
+    def test_request_registry_not_indexed(self):
+        from pyramid_skosprovider.indexes import get_indexes
+        self.regis = self._get_registry('threaded_thread')
+        assert self._get_uri()['id'] == 1
+        assert get_indexes(self.config.registry)._indexes == {}
+
+
+class BulkViewTests(ProviderViewTestCase):
+
+    def test_one_lookup_per_provider(self):
+
+        class BulkProvider(DictionaryProvider):
+            calls = []
+
+            def get_by_ids(self, ids):
+                self.calls.append(ids)
+                return [self.get_by_id(id) for id in ids]
+
+        from .fixtures.data import larch, chestnut, species
+        provider = BulkProvider(
+            {'id': 'TREES'}, [larch, chestnut, species],
+            concept_scheme=trees.concept_scheme
+        )
+        self.regis = Registry()
+        self.regis.register_provider(provider)
+        request = self._get_dummy_request(params={'ids': '2,1,2'})
+        request.matchdict = {'scheme_id': 'TREES'}
+        found = self._get_provider_view(request).get_conceptscheme_bulk()
+        assert [c.id for c in found] == [2, 1, 2]
+        assert provider.calls == [['2', '1']]